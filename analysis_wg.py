@@ -1,84 +1,112 @@
 import os
-import json
+import sys
+from utils.charts import chart, render
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
+from utils.analysis import ResultStore, wordgrid_dicts, wordgrid_metrics
 
-# Check if the folder exists, and if not, create it
-os.makedirs('charts', exist_ok=True)
-archive_folder_path = '#Archive/'
-os.makedirs(archive_folder_path, exist_ok=True)
-combined_results_path = 'results/results_wg.json'  # Updated path to match the uploaded file
+RESULTS_STREAM = 'results/results_wg.jsonl'
+combined_results_path = 'results/results_wg.json'
 
-# Load the JSON data from the file
-with open(combined_results_path, 'r') as file:
-    data = json.load(file)
+def load_results(all_sweeps=False):
+    """
+    Bring the columnar store up to date with the wordgrid results and return the tidy table of
+    (llm_type, objective, attempt, turn, false_count, success) rows.
+    """
+    store = ResultStore('wordgrid', wordgrid_dicts)
+    added = store.ingest(RESULTS_STREAM if os.path.exists(RESULTS_STREAM) else combined_results_path)
+    print(f"Ingested {added} new turns.")
+    return store.load(all_generations=all_sweeps)
 
-# Define a function to compute metrics
-def compute_metrics(data):
-    success_rate, avg_false_counts, all_false_counts = {}, {}, {}
-    for matrix, attempts in data.items():
-        matrix_successes = sum(1 for attempt in attempts if 'success' in attempt and attempt['success'])
-        total_attempts = len(attempts)
-        success_rate[matrix] = matrix_successes / total_attempts if total_attempts else 0
-        total_false_counts = sum(run['false_count'] for attempt in attempts if 'runs' in attempt for run in attempt['runs'] if 'false_count' in run)
-        total_runs = sum(len(attempt['runs']) for attempt in attempts if 'runs' in attempt)
-        avg_false_counts[matrix] = total_false_counts / total_runs if total_runs else 0
-        all_false_counts[matrix] = [run['false_count'] for attempt in attempts if 'runs' in attempt for run in attempt['runs'] if 'false_count' in run]
-    return success_rate, avg_false_counts, all_false_counts
+def compute_metrics(df):
+    """
+    Success rates and average false counts per model and matrix size, each computed as one
+    group-by over the tidy table.
+    """
+    metrics = wordgrid_metrics(df)
+    labels = lambda series: series.set_axis([f'{llm_type} {objective}' for llm_type, objective in series.index])
+    success_rate = labels(metrics['success_rate'])
+    avg_false_counts = labels(metrics['avg_false_count']).reindex(success_rate.index, fill_value=0)
+    return success_rate, avg_false_counts
 
-# Compute success rates, average false counts, and collect all false counts for histogram
-success_rates, avg_false_counts, all_false_counts = compute_metrics(data)
+@chart('success_rates', 'wg_success_rates.png')
+def plot_success_rates(df):
+    # Plot Success Rate by Matrix Size
+    success_rates, _ = compute_metrics(df)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(success_rates.index, success_rates.values, color='green', alpha=0.6, label='Success Rate')
+    ax.set_ylabel('Success Rate')
+    ax.legend()
+    return fig
 
-# Plot Success Rate by Matrix Size
-plt.figure(figsize=(10, 5))
-plt.bar(success_rates.keys(), success_rates.values(), color='green', alpha=0.6, label='Success Rate')
-plt.ylabel('Success Rate')
-plt.legend()
-plt.savefig(f'charts/wg_success_rates.png')
+@chart('success_and_avg_false_count', 'wg_success_and_avg_false_count.png')
+def plot_success_and_false_counts(df):
+    # Plot Success Rate and Average False Count by Matrix Size
+    success_rates, avg_false_counts = compute_metrics(df)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    bar_positions = np.arange(len(success_rates))
+    ax.bar(bar_positions - 0.2, success_rates.values, width=0.4, color='green', alpha=0.6, label='Success Rate')
+    ax.bar(bar_positions + 0.2, avg_false_counts.values, width=0.4, color='red', alpha=0.6, label='Avg False Count')
+    ax.set_xticks(bar_positions, success_rates.index)
+    ax.set_ylabel('Rate')
+    ax.set_title('Success Rate and Average False Count by Matrix Size')
+    ax.legend()
+    return fig
 
-# Plot Success Rate and Average False Count by Matrix Size
-plt.figure(figsize=(10, 5))
-bar_positions = np.arange(len(success_rates))
-plt.bar(bar_positions - 0.2, success_rates.values(), width=0.4, color='green', alpha=0.6, label='Success Rate')
-plt.bar(bar_positions + 0.2, avg_false_counts.values(), width=0.4, color='red', alpha=0.6, label='Avg False Count')
-plt.xticks(bar_positions, success_rates.keys())
-plt.ylabel('Rate')
-plt.title('Success Rate and Average False Count by Matrix Size')
-plt.legend()
-plt.savefig('charts/wg_success_and_avg_false_count.png')
+@chart('distribution_of_false_counts', 'wg_distribution_of_false_counts.png')
+def plot_false_count_distribution(df):
+    # Distribution of False Counts by Matrix Size, as counts per value rather than a KDE over every turn
+    distribution = wordgrid_metrics(df)['false_count_distribution'].unstack(fill_value=0)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    bar_width = 0.8 / max(len(distribution), 1)
+    for i, (key, counts) in enumerate(distribution.iterrows()):
+        ax.bar(counts.index.astype(float) + i * bar_width, counts.values, width=bar_width, alpha=0.6, label=' '.join(key))
+    ax.set_title('Distribution of False Counts by Matrix Size')
+    ax.set_xlabel('False Counts')
+    ax.set_ylabel('Frequency')
+    ax.legend()
+    ax.grid(axis='y', alpha=0.75)
+    return fig
 
-# Plot Distribution of False Counts by Matrix Size
-plt.figure(figsize=(10, 5))
-for matrix, counts in all_false_counts.items():
-    if counts:  # Ensure counts is not empty
-        sns.histplot(counts, bins=max(counts)-min(counts)+1, kde=True, label=matrix, alpha=0.5)
-plt.title('Distribution of False Counts by Matrix Size')
-plt.xlabel('False Counts')
-plt.ylabel('Frequency')
-plt.legend()
-plt.grid(axis='y', alpha=0.75)
-plt.savefig('charts/wg_distribution_of_false_counts.png')
+@chart('normalized_success_rate_and_avg_false_count', 'wg_normalized_success_rate_and_avg_false_count.png')
+def plot_normalized(df):
+    # Normalize for visualization
+    success_rates, avg_false_counts = compute_metrics(df)
+    max_success_rate = success_rates.max() if len(success_rates) else 1
+    max_avg_false_count = avg_false_counts.max() if len(avg_false_counts) else 1
+    normalized = pd.DataFrame({
+        'Matrix Size': success_rates.index,
+        'Normalized Success Rate': success_rates.values / max_success_rate if max_success_rate > 0 else 0,
+        'Normalized Avg False Count': avg_false_counts.values / max_avg_false_count if max_avg_false_count > 0 else 0
+    })
 
-# Normalize for visualization
-max_success_rate = max(success_rates.values()) if success_rates.values() else 1
-max_avg_false_count = max(avg_false_counts.values()) if avg_false_counts.values() else 1
+    # Visualization of Normalized Success Rate and Avg False Count
+    fig, ax = plt.subplots(figsize=(12, 8))
+    sns.barplot(data=normalized, x='Matrix Size', y='Normalized Avg False Count', color='blue', label='Normalized Avg False Count', ax=ax)
+    sns.lineplot(data=normalized, x='Matrix Size', y='Normalized Success Rate', color='red', marker='o', label='Normalized Success Rate', ax=ax)
+    ax.set_title('Normalized Success Rate and Avg False Count')
+    ax.set_ylabel('Normalized Rate')
+    ax.legend()
+    return fig
 
-df = pd.DataFrame({
-    'Matrix Size': list(avg_false_counts.keys()),
-    'Normalized Success Rate': [rate / max_success_rate if max_success_rate > 0 else 0 for rate in success_rates.values()],
-    'Normalized Avg False Count': [count / max_avg_false_count if max_avg_false_count > 0 else 0 for count in avg_false_counts.values()]
-})
+def main(names=None, all_sweeps=False):
+    """
+    Print the metrics and render the named charts, or every chart, skipping unchanged ones. Only the
+    latest sweep is analysed unless all_sweeps is set.
+    """
+    df = load_results(all_sweeps)
+    if df.empty:
+        print("No wordgrid results to analyse.")
+        return
+    success_rates, avg_false_counts = compute_metrics(df)
+    print(pd.DataFrame({'success_rate': success_rates, 'avg_false_count': avg_false_counts}))
 
-# Ensure all lists are the same length
-assert len(df['Matrix Size']) == len(df['Normalized Success Rate']) == len(df['Normalized Avg False Count'])
+    for path in render(df, names):
+        print(f"Saved {path}")
 
-# Visualization of Normalized Success Rate and Avg False Count
-plt.figure(figsize=(12, 8))
-sns.barplot(data=df, x='Matrix Size', y='Normalized Avg False Count', color='blue', label='Normalized Avg False Count')
-sns.lineplot(data=df, x='Matrix Size', y='Normalized Success Rate', color='red', marker='o', label='Normalized Success Rate')
-plt.title('Normalized Success Rate and Avg False Count')
-plt.ylabel('Normalized Rate')
-plt.legend()
-plt.savefig('charts/wg_normalized_success_rate_and_avg_false_count.png')
+if __name__ == "__main__":
+    # python analysis_wg.py [--all-sweeps] [chart ...]
+    names = [name for name in sys.argv[1:] if name != '--all-sweeps']
+    main(names or None, all_sweeps='--all-sweeps' in sys.argv)
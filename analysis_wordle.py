@@ -1,87 +1,109 @@
-import json
-import pandas as pd
+import os
+import sys
+from utils.charts import chart, render
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils.analysis import ResultStore, wordle_rows, wordle_games, wordle_metrics
 
-# Load the JSON data
-file_path = 'results/results_wordle.json'
-with open(file_path, 'r') as file:
-    data = json.load(file)
+RESULTS_STREAM = 'results/results_wordle.jsonl'
+RESULTS_JSON = 'results/results_wordle.json'
 
-# Convert the JSON data to a Pandas DataFrame
-df = pd.DataFrame(data)
+def load_results(all_sweeps=False):
+    """
+    Bring the columnar store up to date with the results and return the table of the latest sweep,
+    or of every sweep kept in the store. The stream is read incrementally; the compacted JSON is
+    only used when there is no stream.
+    """
+    store = ResultStore('wordle', wordle_rows)
+    added = store.ingest(RESULTS_STREAM if os.path.exists(RESULTS_STREAM) else RESULTS_JSON)
+    print(f"Ingested {added} new turns.")
+    return store.load(all_generations=all_sweeps)
 
-# Success Analysis: Calculate the number of successful guesses
-successes = df[df['Guessed word'] == df['Target word']].shape[0]
-
-# Progression Analysis: Prepare data for analyzing trends of 'G' and 'Y' counts over attempts within each run
-# We'll group by 'Run #' and then examine the 'G' and 'Y' trends within those groups
-g_y_trends = df.groupby('Run #').apply(lambda x: x[['Number of \'G\' in colorised results', 'Number of \'Y\' in colorised results']].values.tolist(), include_groups=False)
-# Displaying the total number of successes
-successes, g_y_trends.head()
-def plot_g_y_trends_for_all_runs(g_y_trends):
-    runs_to_plot = g_y_trends.index.unique()  # Automatically determine all runs
-    num_runs = len(runs_to_plot)
-    fig, axes = plt.subplots(nrows=num_runs, ncols=1, figsize=(10, 5 * num_runs), sharex=True)
-
-    if num_runs == 1:  # Adjust if there's only one run to plot
-        axes = [axes]
-
-    for run, ax in zip(runs_to_plot, axes):
-        trends = g_y_trends.loc[run]
-        attempts = range(1, len(trends) + 1)
-        g_counts = [trend[0] for trend in trends]
-        y_counts = [trend[1] for trend in trends]
-        
-        ax.plot(attempts, g_counts, marker='o', linestyle='-', color='green', label='Correct Position (G)')
-        ax.plot(attempts, y_counts, marker='o', linestyle='-', color='orange', label='Correct Letter, Wrong Position (Y)')
-        ax.set_title(f'Run #{run} Trends of G and Y Counts')
+@chart('g_y_trends', 'wordle_g_y_trends.png')
+def plot_g_y_trends(df):
+    # Mean G and Y per turn with the interquartile band, one small panel per LLM, so the figure
+    # stays the same size however many games there are
+    llm_types = sorted(df['llm_type'].unique())
+    fig, axes = plt.subplots(nrows=1, ncols=len(llm_types), figsize=(5 * len(llm_types), 4), sharey=True, squeeze=False)
+    stats = df.groupby(['llm_type', 'turn'])[['greens', 'yellows']].quantile([0.25, 0.75]).unstack()
+    means = df.groupby(['llm_type', 'turn'])[['greens', 'yellows']].mean()
+    for llm_type, ax in zip(llm_types, axes[0]):
+        for column, colour, label in (('greens', 'green', 'Correct Position (G)'), ('yellows', 'orange', 'Correct Letter, Wrong Position (Y)')):
+            turns = means.loc[llm_type].index
+            ax.plot(turns, means.loc[llm_type, column], marker='o', color=colour, label=label)
+            ax.fill_between(turns, stats.loc[llm_type, (column, 0.25)], stats.loc[llm_type, (column, 0.75)], color=colour, alpha=0.2)
+        ax.set_title(f'{llm_type}: G and Y Counts per Attempt')
         ax.set_xlabel('Attempt Number')
         ax.set_ylabel('Count')
         ax.legend()
         ax.grid(True)
+    fig.tight_layout()
+    return fig
 
-    plt.tight_layout()
-    # Save the figure
-    plt.savefig('charts/wordle_g_y_trends.png', format='png')
-
-# Call the function to plot and save the figure for all runs
-plot_g_y_trends_for_all_runs(g_y_trends)
-
-# Preparing data for visualization
-# We need to reset the index to work with 'Run #' as a regular column for easier plotting
-df_reset = df.reset_index()
-# Plotting
-plt.figure(figsize=(14, 7))
+@chart('g_y_games', 'wordle_g_y_games.png')
+def plot_g_y_games(df):
+    # Every game as one row of a heatmap of G counts per turn, readable for thousands of games
+    grid = df.assign(game=wordle_games(df)).pivot_table(index='game', columns='turn', values='greens', aggfunc='max')
+    fig, ax = plt.subplots(figsize=(8, 8))
+    image = ax.imshow(grid.values, aspect='auto', interpolation='nearest', cmap='Greens', vmin=0, vmax=5)
+    ax.set_xticks(range(len(grid.columns)), grid.columns)
+    ax.set_xlabel('Attempt Number')
+    ax.set_ylabel('Game')
+    ax.set_title(f"'G' Counts per Attempt for {len(grid)} Games")
+    fig.colorbar(image, ax=ax)
+    return fig
 
-# Plot for 'G' counts
-sns.lineplot(data=df_reset, x="Run #", y="Number of 'G' in colorised results", marker='o', label="Correct Position ('G')", color="green")
+@chart('avg_g_y_trend', 'wordle_avg_GY_trend.png')
+def plot_avg_g_y_trend(df):
+    means = df.groupby('turn')[['greens', 'yellows']].mean()
+    fig, ax = plt.subplots(figsize=(14, 7))
+    ax.plot(means.index, means['greens'], marker='o', label="Correct Position ('G')", color="green")
+    ax.plot(means.index, means['yellows'], marker='o', label="Correct Letter, Wrong Position ('Y')", color="orange")
+    ax.set_title("Average 'G' and 'Y' Counts per Attempt Across Runs")
+    ax.set_xlabel("Run Number")
+    ax.set_ylabel("Average Count")
+    ax.legend()
+    ax.grid(True)
+    return fig
 
-# Plot for 'Y' counts
-sns.lineplot(data=df_reset, x="Run #", y="Number of 'Y' in colorised results", marker='o', label="Correct Letter, Wrong Position ('Y')", color="orange")
+@chart('heatmap', 'wordle_heatmap avg.png')
+def plot_heatmap(df):
+    # Heatmap of 'G+Y' counts across all attempts and runs, annotated only while that stays legible
+    heatmap_data = df.assign(total=df['greens'] + df['yellows']).pivot_table(index='turn', columns='run', values='total', aggfunc='mean', fill_value=0)
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.heatmap(heatmap_data, annot=heatmap_data.shape[1] <= 30, fmt=".1f", linewidths=.5 if heatmap_data.shape[1] <= 100 else 0, cmap='YlGnBu', ax=ax)
+    ax.set_title("Heatmap of 'G+Y' Counts per Attempt Across All Runs")
+    ax.set_xlabel("Attempt Number")
+    ax.set_ylabel("Run Number")
+    return fig
 
-plt.title("Average 'G' and 'Y' Counts per Attempt Across Runs")
-plt.xlabel("Run Number")
-plt.ylabel("Average Count")
-plt.xticks(rotation=45)
-plt.legend()
-plt.grid(True)
-plt.savefig('charts/wordle_avg_GY_trend.png')
+@chart('g_y_counts', 'wordle_GY_count.png')
+def plot_g_y_counts(df):
+    # Box Plot of 'G' and 'Y' Counts
+    fig, ax = plt.subplots(figsize=(14, 7))
+    sns.boxplot(data=df[['greens', 'yellows']].rename(columns={'greens': "Number of 'G' in colorised results", 'yellows': "Number of 'Y' in colorised results"}), ax=ax)
+    ax.set_title("Box Plot of 'G' and 'Y' Counts Across All Attempts")
+    ax.set_ylabel("Count")
+    return fig
 
-# Heatmap of 'G+Y' counts across all attempts and runs
-df['Total G+Y'] = df["Number of 'G' in colorised results"] + df["Number of 'Y' in colorised results"]
-heatmap_data = df.pivot_table(index='Run #', columns='Global attempt #', values='Total G+Y', aggfunc='mean', fill_value=0)
+def main(names=None, all_sweeps=False):
+    """
+    Print the metrics and render the named charts, or every chart, skipping unchanged ones. Only the
+    latest sweep is analysed unless all_sweeps is set.
+    """
+    df = load_results(all_sweeps)
+    if df.empty:
+        print("No wordle results to analyse.")
+        return
+    metrics = wordle_metrics(df)
+    print(f"{metrics['successes']} of {len(metrics['games'])} games solved.")
+    print(metrics['success_rate'])
+    print(metrics['turn_trends'])
 
-plt.figure(figsize=(12, 7))
-sns.heatmap(heatmap_data, annot=True, fmt=".1f", linewidths=.5, cmap='YlGnBu')
-plt.title("Heatmap of 'G+Y' Counts per Attempt Across All Runs")
-plt.xlabel("Attempt Number")
-plt.ylabel("Run Number")
-plt.savefig('charts/wordle_heatmap avg.png')
+    for path in render(df, names):
+        print(f"Saved {path}")
 
-# Box Plot of 'G' and 'Y' Counts
-plt.figure(figsize=(14, 7))
-sns.boxplot(data=df[['Number of \'G\' in colorised results', 'Number of \'Y\' in colorised results']])
-plt.title("Box Plot of 'G' and 'Y' Counts Across All Attempts")
-plt.ylabel("Count")
-plt.savefig('charts/wordle_GY_count.png')
\ No newline at end of file
+if __name__ == "__main__":
+    # python analysis_wordle.py [--all-sweeps] [chart ...]
+    names = [name for name in sys.argv[1:] if name != '--all-sweeps']
+    main(names or None, all_sweeps='--all-sweeps' in sys.argv)
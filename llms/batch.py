@@ -0,0 +1,133 @@
+import os
+import io
+import json
+import time
+import uuid
+from llms.clients import get_openai
+from llms.llms import system_message
+
+BATCH_DIR = os.getenv('LLM_BATCH_DIR', '.cache/batches')
+POLL_INTERVAL = 30  # Seconds between status checks on a submitted batch
+ENDPOINT = '/v1/chat/completions'
+
+def build_request(custom_id, prompt, model, system_p=system_message, json_mode=True):
+    """
+    One line of a batch file, shaped like the body llm_call_gpt_json would send.
+    """
+    body = {
+        'model': model,
+        'messages': [
+            {'role': 'system', 'content': system_p},
+            {'role': 'user', 'content': f"Respond in JSON. {prompt}" if json_mode else f"{prompt}"}
+        ]
+    }
+    if json_mode:
+        body['response_format'] = {'type': 'json_object'}
+    return {'custom_id': custom_id, 'method': 'POST', 'url': ENDPOINT, 'body': body}
+
+def write_batch_file(requests, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as file:
+        for request in requests:
+            file.write(json.dumps(request) + '\n')
+    return path
+
+def parse_output_lines(lines):
+    """
+    Map custom_id -> message content from the lines of a batch output file. Failed requests map to None.
+    """
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get('response') or {}
+        try:
+            results[record['custom_id']] = response['body']['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            results[record['custom_id']] = None
+    return results
+
+class OpenAIBatchBackend:
+    """
+    Submits batch files to the OpenAI Batch API.
+    """
+    def submit(self, path):
+        client = get_openai()
+        with open(path, 'rb') as file:
+            batch_file = client.files.create(file=file, purpose='batch')
+        batch = client.batches.create(input_file_id=batch_file.id, endpoint=ENDPOINT, completion_window='24h')
+        return batch.id
+
+    def status(self, batch_id):
+        return get_openai().batches.retrieve(batch_id).status
+
+    def results(self, batch_id):
+        client = get_openai()
+        batch = client.batches.retrieve(batch_id)
+        content = client.files.content(batch.output_file_id)
+        return parse_output_lines(io.StringIO(content.text))
+
+class LocalBatchBackend:
+    """
+    A file-based stand-in for a provider batch API, so batch sweeps can run without a network.
+
+    Submitted files are copied into directory and answered line by line with responder(body) -> str
+    on the first status check, writing an output file in the provider's format.
+    """
+    def __init__(self, responder, directory=BATCH_DIR):
+        self.responder = responder
+        self.directory = directory
+
+    def _path(self, batch_id, kind):
+        return os.path.join(self.directory, f"{batch_id}_{kind}.jsonl")
+
+    def submit(self, path):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'r') as source, open(self._path(batch_id, 'input'), 'w') as target:
+            target.write(source.read())
+        return batch_id
+
+    def status(self, batch_id):
+        if not os.path.exists(self._path(batch_id, 'output')):
+            with open(self._path(batch_id, 'input'), 'r') as source, open(self._path(batch_id, 'output'), 'w') as target:
+                for line in source:
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)
+                    content = self.responder(request['body'])
+                    response = {'status_code': 200, 'body': {'choices': [{'message': {'role': 'assistant', 'content': content}}]}}
+                    target.write(json.dumps({'custom_id': request['custom_id'], 'response': response}) + '\n')
+        return 'completed'
+
+    def results(self, batch_id):
+        with open(self._path(batch_id, 'output'), 'r') as file:
+            return parse_output_lines(file)
+
+def run_batch(prompts, model, system_p=system_message, backend=None, poll_interval=POLL_INTERVAL, json_mode=True):
+    """
+    Send every prompt in one batch and wait for the answers.
+
+    Args:
+        prompts: A dict of custom_id -> prompt. The ids must be unique strings.
+        backend: OpenAIBatchBackend() by default, or LocalBatchBackend for offline runs.
+
+    Returns:
+        A dict of custom_id -> response text, with None for requests the provider failed.
+    """
+    backend = backend or OpenAIBatchBackend()
+    requests = [build_request(custom_id, prompt, model, system_p, json_mode) for custom_id, prompt in prompts.items()]
+    path = write_batch_file(requests, os.path.join(BATCH_DIR, f"requests_{uuid.uuid4().hex}.jsonl"))
+    batch_id = backend.submit(path)
+    print(f"Submitted batch {batch_id} with {len(requests)} requests.")
+
+    status = backend.status(batch_id)
+    while status in ('validating', 'in_progress', 'finalizing'):
+        time.sleep(poll_interval)
+        status = backend.status(batch_id)
+    if status != 'completed':
+        raise RuntimeError(f"Batch {batch_id} ended with status '{status}'")
+
+    results = backend.results(batch_id)
+    return {custom_id: results.get(custom_id) for custom_id in prompts}
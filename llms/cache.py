@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import threading
+from functools import wraps
+from llms.tracing import current_context
+
+# LLM_CACHE is one of 'off' (bypass, the default), 'on' (read and write) or 'replay' (read only, a miss is an error)
+CACHE_MODE = os.getenv('LLM_CACHE', 'off')
+CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.cache/llm_cache.sqlite')
+CACHE_MAX_BYTES = int(float(os.getenv('LLM_CACHE_MAX_MB', 512)) * 1024 * 1024)
+
+class CacheMiss(KeyError):
+    """
+    Raised in replay mode when a call has no stored response.
+    """
+
+class ResponseCache:
+    """
+    An on-disk, size-bounded store of model responses keyed by a hash of the call.
+
+    Keys include the trace_context ids of the call (game, llm_type, run, attempt, turn, ...), so each
+    game replays its own answers however the concurrent runner schedules the games. Identical calls
+    within the same context are numbered in the order they are made, which is deterministic as a
+    game plays its turns one after another.
+    """
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, mode=CACHE_MODE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._occurrences = {}
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        return self._conn
+
+    def next_key(self, provider, call):
+        """
+        Hash the provider, the bound call arguments and the trace_context ids, then number it by
+        occurrence.
+        """
+        digest = hashlib.sha256(json.dumps([provider, call, current_context()], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            occurrence = self._occurrences.get(digest, 0)
+            self._occurrences[digest] = occurrence + 1
+        return f"{digest}:{occurrence}"
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        try:
+            encoded = json.dumps({'value': value})
+        except TypeError:
+            return  # Not serialisable, so not cacheable
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, encoded, len(encoded), time.time()))
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        """
+        Drop least recently used responses until the store is back under max_bytes.
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self._occurrences.clear()
+
+response_cache = ResponseCache()
+
+def cached(provider):
+    """
+    Put the response cache in front of an llm_call_* function.
+
+    The key covers the provider, the function and all of its bound arguments, i.e. model, system
+    prompt, prompt and temperature, as well as the trace_context ids of the game making the call.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if response_cache.mode == 'off':
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = response_cache.next_key(provider, [func.__name__, bound.arguments])
+            hit = response_cache.get(key)
+            if hit is not None:
+                return hit['value']
+            if response_cache.mode == 'replay':
+                raise CacheMiss(f"No cached response for {func.__name__} ({provider}) in replay mode")
+            value = func(*args, **kwargs)
+            response_cache.put(key, value)
+            return value
+
+        return wrapper
+    return decorator
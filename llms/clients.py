@@ -0,0 +1,94 @@
+import os
+import json
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from groq import Groq
+from openai import OpenAI
+from anthropic import Anthropic
+import google.generativeai as genai
+from llms.tracing import mark_request, mark_first_byte
+from dotenv import load_dotenv
+load_dotenv()
+
+# Retries happen in one place (utils.retry), so the SDKs' own retry loops are switched off
+MAX_RETRIES = 0
+
+# Connection pool settings, shared by every client built here. Override with env vars or configure_pools().
+POOL_CONNECTIONS = int(os.getenv('LLM_POOL_CONNECTIONS', 10))  # Number of distinct hosts to keep pools for
+POOL_MAXSIZE = int(os.getenv('LLM_POOL_MAXSIZE', 32))  # Connections kept alive per host
+KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 30))  # Seconds an idle connection stays open
+
+_clients = {}
+_lock = threading.RLock()
+
+def configure_pools(pool_connections=None, pool_maxsize=None, keepalive_expiry=None):
+    """
+    Change the connection pool settings. Existing clients are dropped so the next call rebuilds them.
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, KEEPALIVE_EXPIRY
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if keepalive_expiry is not None:
+        KEEPALIVE_EXPIRY = keepalive_expiry
+    reset_clients()
+
+def reset_clients():
+    """
+    Forget every cached client, e.g. after changing API keys or pool settings.
+    """
+    with _lock:
+        _clients.clear()
+
+def _get_or_build(key, factory):
+    """
+    Return the client stored under key, building it once per process even when many threads ask at once.
+    """
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+def _http_client():
+    limits = httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE, keepalive_expiry=KEEPALIVE_EXPIRY)
+    # The hooks time each request's first byte for llms.tracing
+    return httpx.Client(limits=limits, event_hooks={'request': [mark_request], 'response': [mark_first_byte]})
+
+def get_openai():
+    return _get_or_build('openai', lambda: OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=MAX_RETRIES, http_client=_http_client()))
+
+def get_anthropic():
+    return _get_or_build('anthropic', lambda: Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=MAX_RETRIES, http_client=_http_client()))
+
+def get_groq():
+    return _get_or_build('groq', lambda: Groq(api_key=os.getenv('GROQ_API_KEY'), max_retries=MAX_RETRIES, http_client=_http_client()))
+
+def get_session():
+    """
+    A requests session with keep-alive pooling, used for the local Ollama server.
+    """
+    def build():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    return _get_or_build('session', build)
+
+def get_gemini(model, generation_config):
+    """
+    Gemini models are configured per generation_config, so cache one per (model, config).
+    """
+    def build():
+        if 'gemini_configured' not in _clients:
+            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+            _clients['gemini_configured'] = True
+        return genai.GenerativeModel(model_name=model, generation_config=generation_config)
+    return _get_or_build(('gemini', model, json.dumps(generation_config, sort_keys=True)), build)
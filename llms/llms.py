@@ -1,25 +1,101 @@
-from groq import Groq
-from openai import OpenAI
-from anthropic import Anthropic
 import os
 import json
 import time
-import requests
-import google.generativeai as genai
 from dotenv import load_dotenv
 load_dotenv()
+from llms.clients import get_openai, get_anthropic, get_groq, get_gemini, get_session
+from llms.cache import cached
+from llms.tracing import traced, record_usage, record_tokens, mark_first_byte
+from utils.parsing import complete_answer
 from utils.retry import retry_except
-from tenacity import retry, stop_after_attempt, wait_fixed
+from utils.ratelimit import rate_limited
+from llms.schemas import SCHEMAS, gemini_schema, validate
 
 system_message = "You are an AI trained to be a brilliant puzzle solver and a genius at lateral thinking. You are brilliant and conscientious."
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://0.0.0.0:11434/api/generate')
+
+def collect_stream(chunks, stop=None):
+    """
+    Join the text chunks of a streamed response as they arrive.
+
+    Args:
+        stop: Optional (kind, size[, json_only]) for utils.parsing.complete_answer, e.g. ('word', 5)
+              or ('word_list', 3, True). The stream is closed as soon as a complete answer has arrived, and
+              only the answer is returned, which saves the rest of a verbose model's output.
+    """
+    text = ""
+    try:
+        for chunk in chunks:
+            if not text:
+                mark_first_byte()
+            text += chunk
+            if stop:
+                answer = complete_answer(text, *stop)
+                if answer is not None:
+                    return answer
+    finally:
+        chunks.close()  # Drops the connection when we stop early
+    return text
+
+def ollama_chunks(r):
+    try:
+        for line in r.iter_lines():
+            if line:
+                json_line = json.loads(line.decode('utf-8'))
+                if json_line.get("done"):
+                    record_usage(json_line)
+                yield json_line.get("response", "")
+                if json_line.get("done"):
+                    break
+    finally:
+        r.close()
+
+def chat_chunks(stream):
+    """
+    Text of an OpenAI-style chat completion stream (OpenAI and Groq).
+    """
+    try:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                record_usage(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.response.close()
+
+def anthropic_chunks(stream):
+    """
+    Text, or the JSON of a forced tool call, of an Anthropic message stream.
+    """
+    try:
+        for event in stream:
+            if event.type == "message_start":
+                record_tokens(prompt=event.message.usage.input_tokens)
+            elif event.type == "message_delta":
+                record_tokens(completion=event.usage.output_tokens)
+            elif event.type == "content_block_delta":
+                if event.delta.type == "text_delta":
+                    yield event.delta.text
+                elif event.delta.type == "input_json_delta":
+                    yield event.delta.partial_json
+    finally:
+        stream.response.close()
+
+def gemini_chunks(response):
+    last = None
+    for chunk in response:
+        last = chunk
+        yield chunk.text
+    record_usage(last)
 
 # Add a schema for gemini to use as an example
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("openai")
+@traced("openai", "GPT")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("openai", "GPT", "input", "system_p")
 def llm_call_gpt(input, GPT, system_p = system_message, temp = 0.7):
-    client = OpenAI()
-    client.api_key = os.getenv('OPENAI_API_KEY')
+    client = get_openai()
     response = client.chat.completions.create(
         model=GPT,
         messages=[
@@ -27,13 +103,15 @@ def llm_call_gpt(input, GPT, system_p = system_message, temp = 0.7):
             {"role": "user", "content": f"{input}"}
         ]
     )
+    record_usage(response)
     return response.choices[0].message.content
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("openai")
+@traced("openai", "GPT")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("openai", "GPT", "input", "INSTRUCTION")
 def llm_call_gpt_assistant(input, INSTRUCTION, GPT, temp = 0.7):
-    client = OpenAI()
-    client.api_key = os.getenv('OPENAI_API_KEY')
+    client = get_openai()
     assistant = client.beta.assistants.create(
     name="PoY Evaluator to read DB",
     instructions=INSTRUCTION,
@@ -52,11 +130,12 @@ def llm_call_gpt_assistant(input, INSTRUCTION, GPT, temp = 0.7):
 
     return returned_response
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("openai")
+@traced("openai", "GPT")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("openai", "GPT", "input", "system_p")
 def llm_call_gpt_json(input, GPT, system_p = system_message, temp = 0.7):
-    client = OpenAI()
-    client.api_key = os.getenv('OPENAI_API_KEY')
+    client = get_openai()
     response = client.chat.completions.create(
         model=GPT,
         messages=[
@@ -65,13 +144,15 @@ def llm_call_gpt_json(input, GPT, system_p = system_message, temp = 0.7):
         ],
         response_format={ "type": "json_object" }
     )
+    record_usage(response)
     return response.choices[0].message.content
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("anthropic")
+@traced("anthropic", "LLM")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("anthropic", "LLM", "input", "system_p")
 def llm_call_claude(input, LLM, system_p = system_message, temp = 0.7):
-    api_key = os.environ.get('ANTHROPIC_API_KEY')
-    client = Anthropic(api_key=api_key)
-    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    client = get_anthropic()
     response = client.messages.create(
         model=LLM,
         system = system_p,
@@ -81,11 +162,15 @@ def llm_call_claude(input, LLM, system_p = system_message, temp = 0.7):
         temperature=temp,
         max_tokens=4096,
     )
+    record_usage(response)
     return response.content[0].text
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("anthropic")
+@traced("anthropic", "LLM")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("anthropic", "LLM", "input", "system_p")
 def llm_call_claude_json(input, LLM, system_p = system_message, temp = 0.7):
-    client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    client = get_anthropic()
     response = client.messages.create(
         model=LLM,
         system = system_p,
@@ -96,56 +181,49 @@ def llm_call_claude_json(input, LLM, system_p = system_message, temp = 0.7):
         temperature=temp,
         max_tokens=4096,
     )
+    record_usage(response)
     message = response.content[0].text
     output_json = json.loads("{" + message[:message.rfind("}") + 1])
     return output_json
 
-# @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def llm_call_ollama_json(prompt, LLM = "llama3:8b", temp = 0.7):
-    r = requests.post('http://0.0.0.0:11434/api/generate',
+@cached("ollama")
+@traced("ollama", "LLM")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("ollama", "LLM", "prompt")
+def llm_call_ollama_json(prompt, LLM = "llama3:8b", temp = 0.7, stop = None):
+    r = get_session().post(OLLAMA_URL,
                       json={
                           'model': LLM, #llama2:7b
                           'prompt': f"{prompt}. Return this as JSON.",
                           'format': 'json',
                       },
-                      stream=False)
-    full_response = ""
-    for line in r.iter_lines():
-        if line:
-            decoded_line = line.decode('utf-8')
-            json_line = json.loads(decoded_line)
-            full_response += json_line.get("response", "")
-            if json_line.get("done"):
-                break
-
+                      stream=True)
+    full_response = collect_stream(ollama_chunks(r), stop)
     print(full_response)
     return full_response
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def llm_call_ollama(prompt, LLM = "llama3:8b", temp = 0.7):
-    r = requests.post('http://0.0.0.0:11434/api/generate',
+@cached("ollama")
+@traced("ollama", "LLM")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("ollama", "LLM", "prompt")
+def llm_call_ollama(prompt, LLM = "llama3:8b", temp = 0.7, stop = None):
+    r = get_session().post(OLLAMA_URL,
                       json={
                           'model': LLM,
                           'prompt': f"{prompt}"
                       },
-                      stream=False)
-    full_response = ""
-    for line in r.iter_lines():
-        if line:
-            decoded_line = line.decode('utf-8')
-            json_line = json.loads(decoded_line)
-            full_response += json_line.get("response", "")
-            if json_line.get("done"):
-                break
-
+                      stream=True)
+    full_response = collect_stream(ollama_chunks(r), stop)
     print(full_response)
     return full_response
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("groq")
+@traced("groq", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("groq", "model", "prompt", "system_p")
 def llm_call_groq(prompt, system_p = system_message, model:str="llama3-70b-8192", temp = 0.7):
     system_prompt = system_p
-    client = Groq()
+    client = get_groq()
     messages = [{
             "role": "system",
             "content": system_prompt
@@ -154,39 +232,290 @@ def llm_call_groq(prompt, system_p = system_message, model:str="llama3-70b-8192"
             "role": "user",
             "content": prompt
         }]
-    return client.chat.completions.create(messages=messages, model=model)
+    response = client.chat.completions.create(messages=messages, model=model)
+    record_usage(response)
+    return response.choices[0].message.content
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
+@cached("gemini")
+@traced("gemini", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("gemini", "model", "prompt", "system_p")
 def llm_call_gemini(prompt, model="gemini-1.5-pro", system_p=system_message):
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
     generation_config = {
         "temperature": 0.7,
         "top_p": 0.95,
         "top_k": 40
     }
-    model = genai.GenerativeModel(
-        model_name=model,
-        generation_config=generation_config,
-    )
+    model = get_gemini(model, generation_config)
     response = model.generate_content(prompt)
+    record_usage(response)
     return response.text
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def llm_call_gemini_json(prompt, schema, model="gemini-1.5-pro", system_p=system_message):
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+@cached("gemini")
+@traced("gemini", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("gemini", "model", "prompt", "system_p")
+def llm_call_gemini_json(prompt, schema=None, model="gemini-1.5-pro", system_p=system_message):
     generation_config = {
         "temperature": 0.7,
         "top_p": 0.95,
         "top_k": 40,
         "response_mime_type": "application/json"
     }
-    model = genai.GenerativeModel(
-        model_name=model,
-        generation_config=generation_config,
-    )
+    model = get_gemini(model, generation_config)
+    if schema is None:
+        response = model.generate_content(f"The prompt: {prompt}. Please reply in JSON.")
+        record_usage(response)
+        return response.text
     response = model.generate_content(f"The prompt: {prompt}. Please reply using a JSON schema like this: {schema}")
+    record_usage(response)
+    return response.text
+
+# Structured output: every provider is asked for JSON matching one of llms.schemas.SCHEMAS, using its
+# own constrained decoding where it has one. Each returns the raw JSON text, validated by llm_call_structured.
+
+@cached("openai")
+@traced("openai", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("openai", "model", "prompt", "system_p")
+def structured_openai(prompt, schema_name, model, system_p=system_message):
+    client = get_openai()
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_p},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={"type": "json_schema", "json_schema": {"name": schema_name, "schema": SCHEMAS[schema_name], "strict": True}}
+    )
+    record_usage(response)
+    return response.choices[0].message.content
+
+@cached("anthropic")
+@traced("anthropic", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("anthropic", "model", "prompt", "system_p")
+def structured_anthropic(prompt, schema_name, model, system_p=system_message, temp=0.7):
+    # Claude has no JSON mode, but a forced tool call is decoded against the tool's input schema
+    client = get_anthropic()
+    response = client.messages.create(
+        model=model,
+        system=system_p,
+        messages=[{"role": "user", "content": prompt}],
+        tools=[{"name": schema_name, "description": "Submit the answer.", "input_schema": SCHEMAS[schema_name]}],
+        tool_choice={"type": "tool", "name": schema_name},
+        temperature=temp,
+        max_tokens=4096,
+    )
+    record_usage(response)
+    return next((json.dumps(block.input) for block in response.content if block.type == "tool_use"), "")
+
+@cached("gemini")
+@traced("gemini", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("gemini", "model", "prompt", "system_p")
+def structured_gemini(prompt, schema_name, model, system_p=system_message):
+    generation_config = {
+        "temperature": 0.7,
+        "top_p": 0.95,
+        "top_k": 40,
+        "response_mime_type": "application/json",
+        "response_schema": gemini_schema(SCHEMAS[schema_name])
+    }
+    response = get_gemini(model, generation_config).generate_content(prompt)
+    record_usage(response)
     return response.text
 
+@cached("groq")
+@traced("groq", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("groq", "model", "prompt", "system_p")
+def structured_groq(prompt, schema_name, model, system_p=system_message):
+    # Groq only has a JSON mode, so the schema goes in the prompt
+    client = get_groq()
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_p},
+            {"role": "user", "content": f"{prompt}\nReply with JSON matching this schema: {json.dumps(SCHEMAS[schema_name])}"}
+        ],
+        response_format={"type": "json_object"}
+    )
+    record_usage(response)
+    return response.choices[0].message.content
+
+@cached("ollama")
+@traced("ollama", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("ollama", "model", "prompt")
+def structured_ollama(prompt, schema_name, model, system_p=system_message):
+    r = get_session().post(OLLAMA_URL,
+                      json={
+                          'model': model,
+                          'system': system_p,
+                          'prompt': prompt,
+                          'format': SCHEMAS[schema_name],
+                          'stream': False,
+                      })
+    body = r.json()
+    record_usage(body)
+    return body.get("response", "")
+
+STRUCTURED_CALLS = {
+    'openai': structured_openai,
+    'claude': structured_anthropic,
+    'gemini': structured_gemini,
+    'groq': structured_groq,
+    'ollama': structured_ollama,
+}
+
+DEFAULT_MODELS = {
+    'openai': 'gpt-4o-mini',
+    'claude': 'claude-3-5-sonnet-20240620',
+    'gemini': 'gemini-1.5-pro',
+    'groq': 'llama3-70b-8192',
+    'ollama': 'llama3:8b',
+}
+
+# Streaming: the same calls, optionally constrained to a schema, but reading tokens as they arrive so
+# that collect_stream can hang up as soon as the answer is complete.
+
+@cached("openai")
+@traced("openai", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("openai", "model", "prompt", "system_p")
+def streamed_openai(prompt, schema_name, model, system_p=system_message, stop=None):
+    client = get_openai()
+    kwargs = {}
+    if schema_name:
+        kwargs['response_format'] = {"type": "json_schema", "json_schema": {"name": schema_name, "schema": SCHEMAS[schema_name], "strict": True}}
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_p},
+            {"role": "user", "content": prompt}
+        ],
+        stream=True,
+        extra_body={"stream_options": {"include_usage": True}},
+        **kwargs
+    )
+    return collect_stream(chat_chunks(stream), stop)
+
+@cached("anthropic")
+@traced("anthropic", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("anthropic", "model", "prompt", "system_p")
+def streamed_anthropic(prompt, schema_name, model, system_p=system_message, stop=None, temp=0.7):
+    client = get_anthropic()
+    kwargs = {}
+    if schema_name:
+        kwargs['tools'] = [{"name": schema_name, "description": "Submit the answer.", "input_schema": SCHEMAS[schema_name]}]
+        kwargs['tool_choice'] = {"type": "tool", "name": schema_name}
+    stream = client.messages.create(
+        model=model,
+        system=system_p,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temp,
+        max_tokens=4096,
+        stream=True,
+        **kwargs
+    )
+    return collect_stream(anthropic_chunks(stream), stop)
+
+@cached("gemini")
+@traced("gemini", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("gemini", "model", "prompt", "system_p")
+def streamed_gemini(prompt, schema_name, model, system_p=system_message, stop=None):
+    generation_config = {
+        "temperature": 0.7,
+        "top_p": 0.95,
+        "top_k": 40
+    }
+    if schema_name:
+        generation_config["response_mime_type"] = "application/json"
+        generation_config["response_schema"] = gemini_schema(SCHEMAS[schema_name])
+    response = get_gemini(model, generation_config).generate_content(prompt, stream=True)
+    return collect_stream(gemini_chunks(response), stop)
+
+@cached("groq")
+@traced("groq", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("groq", "model", "prompt", "system_p")
+def streamed_groq(prompt, schema_name, model, system_p=system_message, stop=None):
+    # Groq's JSON mode can't stream, so a schema only goes in the prompt
+    if schema_name:
+        prompt = f"{prompt}\nReply with JSON matching this schema: {json.dumps(SCHEMAS[schema_name])}"
+    client = get_groq()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_p},
+            {"role": "user", "content": prompt}
+        ],
+        stream=True
+    )
+    return collect_stream(chat_chunks(stream), stop)
+
+@cached("ollama")
+@traced("ollama", "model")
+@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=4, delay=2, transient=True)
+@rate_limited("ollama", "model", "prompt")
+def streamed_ollama(prompt, schema_name, model, system_p=system_message, stop=None):
+    body = {'model': model, 'system': system_p, 'prompt': prompt}
+    if schema_name:
+        body['format'] = SCHEMAS[schema_name]
+    r = get_session().post(OLLAMA_URL, json=body, stream=True)
+    return collect_stream(ollama_chunks(r), stop)
+
+STREAMED_CALLS = {
+    'openai': streamed_openai,
+    'claude': streamed_anthropic,
+    'gemini': streamed_gemini,
+    'groq': streamed_groq,
+    'ollama': streamed_ollama,
+}
+
+def llm_call_stream(prompt, llm_type='openai', model=None, system_p=system_message, schema_name=None, stop=None):
+    """
+    Stream a response from llm_type, stopping early once stop's answer is complete (see collect_stream).
+    With a schema, only a closed JSON field ends the stream.
+    """
+    if stop and schema_name:
+        stop = (*stop[:2], True)
+    return STREAMED_CALLS[llm_type](prompt, schema_name, model or DEFAULT_MODELS[llm_type], system_p, stop)
+
+# Answers that can end a stream early, and the expected size that marks them complete
+STOP_SIZES = {'word': 'length', 'word_list': 'count'}
+
+def llm_call_structured(prompt, schema_name, llm_type='openai', model=None, system_p=system_message, reasks=1, stream=False, **expected):
+    """
+    Ask llm_type for an answer matching the schema called schema_name ('word', 'word_list' or
+    'sudoku_grid') and validate it locally.
+
+    Only a response that does not match the schema, or the shape given in expected (see
+    llms.schemas.validate), is asked again, at most reasks times, with the reason added to the prompt.
+    With stream, the response is streamed and cut off as soon as the answer is complete.
+
+    Returns:
+        The last ParseResult. Its value is the word, word list or grid, and error is None when valid.
+    """
+    model = model or DEFAULT_MODELS[llm_type]
+    if stream:
+        # The schema is in force, so only its closed JSON field ends the stream
+        stop = (schema_name, expected.get(STOP_SIZES[schema_name]), True) if schema_name in STOP_SIZES else None
+        call = lambda request, *args: STREAMED_CALLS[llm_type](request, *args, stop)
+    else:
+        call = STRUCTURED_CALLS[llm_type]
+    request = prompt
+    for _ in range(reasks + 1):
+        result = validate(schema_name, call(request, schema_name, model, system_p), **expected)
+        if result:
+            return result
+        print(f"{llm_type} response did not match the {schema_name} schema: {result.error}")
+        request = f"{prompt}\n\nYour previous reply was rejected because {result.error}. Reply again with JSON matching the schema."
+    return result
+
 def submit_message_and_create_run(client, assistant_id, prompt):
     """
     Submit the message and create the run
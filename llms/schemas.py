@@ -0,0 +1,72 @@
+from utils.parsing import ParseResult, extract_payload, parse_word, parse_word_list, parse_int_grid
+
+# JSON schemas of the answer of each game, in the subset every provider's constrained decoding accepts
+WORD = {
+    'type': 'object',
+    'properties': {'word': {'type': 'string', 'description': 'The guessed word'}},
+    'required': ['word'],
+    'additionalProperties': False,
+}
+WORD_LIST = {
+    'type': 'object',
+    'properties': {'words': {'type': 'array', 'items': {'type': 'string'}, 'description': 'The words of the grid, one per row, in order'}},
+    'required': ['words'],
+    'additionalProperties': False,
+}
+SUDOKU_GRID = {
+    'type': 'object',
+    'properties': {'grid': {'type': 'array', 'items': {'type': 'array', 'items': {'type': 'integer'}}, 'description': 'The rows of the solved board'}},
+    'required': ['grid'],
+    'additionalProperties': False,
+}
+
+SCHEMAS = {
+    'word': WORD,
+    'word_list': WORD_LIST,
+    'sudoku_grid': SUDOKU_GRID,
+}
+
+# Keywords Gemini's response_schema (an OpenAPI subset) understands
+GEMINI_KEYWORDS = ('type', 'properties', 'required', 'items', 'description', 'enum')
+
+def gemini_schema(schema):
+    """
+    A schema with the keywords Gemini rejects, such as additionalProperties, removed.
+    """
+    cleaned = {}
+    for key, value in schema.items():
+        if key == 'items':
+            cleaned[key] = gemini_schema(value)
+        elif key == 'properties':
+            cleaned[key] = {name: gemini_schema(field) for name, field in value.items()}
+        elif key in GEMINI_KEYWORDS:
+            cleaned[key] = value
+    return cleaned
+
+def _field(response, name):
+    payload = extract_payload(response)
+    if not isinstance(payload, dict) or name not in payload:
+        return None
+    return payload[name]
+
+def validate(name, response, **expected):
+    """
+    Check a structured response against the schema called name and return the parsed value.
+
+    Args:
+        expected: Shape checks on the value: length (letters of a word), count (words in a list) or
+            size (rows and columns of a grid).
+    """
+    key = next(iter(SCHEMAS[name]['properties']))
+    value = _field(response, key)
+    if value is None:
+        return ParseResult(None, f"response is not a JSON object with a '{key}' field")
+    if name == 'word':
+        return parse_word({key: value}, **expected) if isinstance(value, str) else ParseResult(None, f"'{key}' is not a string")
+    if name == 'word_list':
+        return parse_word_list({key: value}, **expected) if isinstance(value, list) else ParseResult(None, f"'{key}' is not a list")
+    if name == 'sudoku_grid':
+        if not isinstance(value, list) or not all(isinstance(row, list) and all(isinstance(n, int) for n in row) for row in value):
+            return ParseResult(None, f"'{key}' is not a list of lists of integers")
+        return parse_int_grid({key: value}, **expected)
+    raise KeyError(name)
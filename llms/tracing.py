@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import inspect
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+from utils.results import ResultsWriter, read_records
+from utils.retry import retry_listeners
+
+# LLM_TRACE=off disables tracing. Spans are appended to LLM_TRACE_PATH as JSONL.
+TRACE_ENABLED = os.getenv('LLM_TRACE', 'on').lower() != 'off'
+TRACE_PATH = os.getenv('LLM_TRACE_PATH', 'results/llm_traces.jsonl')
+
+_context = contextvars.ContextVar('llm_trace_context', default={})
+_span = contextvars.ContextVar('llm_span', default=None)
+_sink = None
+_sink_lock = threading.Lock()
+
+@contextmanager
+def trace_context(**ids):
+    """
+    Tag every span started inside the block, in this thread or task, with ids such as game, run,
+    llm_type or turn. Nested blocks add to the ids of the outer one.
+    """
+    token = _context.set({**_context.get(), **ids})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def current_context():
+    """
+    The ids set by the enclosing trace_context blocks.
+    """
+    return dict(_context.get())
+
+def _write(span):
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = ResultsWriter(TRACE_PATH)
+    _sink.write(span)
+
+def current_span():
+    return _span.get()
+
+def traced(provider, model_arg):
+    """
+    Record a span for every call of an llm_call_* function: provider, model, the trace_context ids,
+    tokens, time to first byte, total latency, retries and the error, if any. Goes outside the retry
+    decorator so one span covers every attempt of a call, and inside the cache so cache hits,
+    which never reach a provider, are not counted.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACE_ENABLED:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            span = {
+                'provider': provider,
+                'model': bound.arguments.get(model_arg),
+                'call': func.__name__,
+                **_context.get(),
+                'started': time.time(),
+                'ttfb': None,
+                'latency': None,
+                'prompt_tokens': None,
+                'completion_tokens': None,
+                'retries': 0,
+                'error': None,
+            }
+            token = _span.set(span)
+            start = span['_request_started'] = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                span['error'] = type(e).__name__
+                raise
+            finally:
+                span['latency'] = time.perf_counter() - start
+                span.pop('_request_started', None)
+                _span.reset(token)
+                _write(span)
+
+        return wrapper
+    return decorator
+
+def mark_request(*_):
+    """
+    httpx request hook: an attempt is about to be sent.
+    """
+    span = _span.get()
+    if span is not None:
+        span['_request_started'] = time.perf_counter()
+
+def mark_first_byte(*_):
+    """
+    httpx response hook, or a first streamed token: the provider started answering. Only the
+    successful attempt's time to first byte is kept, as later attempts overwrite earlier ones.
+    Without an httpx request hook, as for Ollama, it is timed from the start of the call.
+    """
+    span = _span.get()
+    if span is not None:
+        span['ttfb'] = time.perf_counter() - span['_request_started']
+
+def _record_retry(exception, attempt):
+    span = _span.get()
+    if span is not None:
+        span['retries'] += 1
+
+retry_listeners.append(_record_retry)
+
+def record_usage(response):
+    """
+    Copy the token counts of a provider response (OpenAI, Groq, Anthropic, Gemini or an Ollama JSON
+    body) onto the current span.
+    """
+    span = _span.get()
+    if span is None or response is None:
+        return
+    if isinstance(response, dict):
+        prompt, completion = response.get('prompt_eval_count'), response.get('eval_count')
+    elif getattr(response, 'usage_metadata', None) is not None:
+        prompt, completion = response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count
+    else:
+        usage = getattr(response, 'usage', None)
+        prompt = getattr(usage, 'prompt_tokens', None) or getattr(usage, 'input_tokens', None)
+        completion = getattr(usage, 'completion_tokens', None) or getattr(usage, 'output_tokens', None)
+    record_tokens(prompt, completion)
+
+def record_tokens(prompt=None, completion=None):
+    """
+    Add token counts to the current span, for streams that report them piecemeal.
+    """
+    span = _span.get()
+    if span is None:
+        return
+    if prompt is not None:
+        span['prompt_tokens'] = (span['prompt_tokens'] or 0) + prompt
+    if completion is not None:
+        span['completion_tokens'] = (span['completion_tokens'] or 0) + completion
+
+def summarise(spans, by=('provider', 'model')):
+    """
+    p50/p95/p99 latency and time to first byte, retries, errors and output tokens per second for
+    each group of spans.
+    """
+    groups = {}
+    for span in spans:
+        groups.setdefault(tuple(span.get(key) for key in by), []).append(span)
+    summary = {}
+    for key, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        latency = np.array([span['latency'] for span in group if span['latency'] is not None])
+        ttfb = np.array([span['ttfb'] for span in group if span.get('ttfb') is not None])
+        ok = [span for span in group if not span['error'] and span['completion_tokens']]
+        summary[key] = {
+            'calls': len(group),
+            'errors': sum(1 for span in group if span['error']),
+            'retries': sum(span['retries'] for span in group),
+            'latency': dict(zip(('p50', 'p95', 'p99'), np.percentile(latency, [50, 95, 99]).round(3).tolist())) if len(latency) else None,
+            'ttfb': dict(zip(('p50', 'p95', 'p99'), np.percentile(ttfb, [50, 95, 99]).round(3).tolist())) if len(ttfb) else None,
+            'tokens_per_second': round(sum(span['completion_tokens'] for span in ok) / sum(span['latency'] for span in ok), 1) if ok else None,
+        }
+    return summary
+
+def report(path=TRACE_PATH, by=('provider', 'model')):
+    for key, stats in summarise(read_records(path), by).items():
+        print(f"{' / '.join(map(str, key))}: {stats['calls']} calls, {stats['errors']} errors, {stats['retries']} retries")
+        print(f"    latency {stats['latency']}, ttfb {stats['ttfb']}, {stats['tokens_per_second']} completion tokens/s")
+
+if __name__ == "__main__":
+    # python -m llms.tracing [path]
+    report(sys.argv[1] if len(sys.argv) > 1 else TRACE_PATH)
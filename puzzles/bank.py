@@ -0,0 +1,117 @@
+import os
+import sys
+import mmap
+import random
+import struct
+import threading
+from multiprocessing import Pool
+from puzzles.sudokugen import generate_unique_sudoku
+from puzzles.wordstore import load_word_store
+
+MAGIC = b'LOOPBNK2'
+HEADER = struct.Struct('<8sBHIqB')  # magic, kind, record size, record count, seed, clues removed (sudoku only)
+SUDOKU, WORDLE = 1, 2
+DIFFICULTIES = ['easy', 'medium', 'hard']
+SUDOKU_RECORD = struct.Struct('<81s81sBH')  # puzzle, solution, difficulty, guesses
+WORDLE_RECORD = struct.Struct('<5s')  # target
+
+SUDOKU_BANK = 'puzzles/banks/sudoku.bank'
+WORDLE_BANK = 'puzzles/banks/wordle.bank'
+SUDOKU_NUM_REMOVE = 64
+
+def sudoku_puzzle(index, seed=0, num_remove=SUDOKU_NUM_REMOVE):
+    """
+    Puzzle index of a seeded bank as (puzzle, solution, grading). Each puzzle only depends on
+    (seed, index, num_remove), so these can be generated in any order and in parallel, and a puzzle
+    generated without a bank is the same one the bank would hold.
+    """
+    return generate_unique_sudoku(num_remove, random.Random(f"{seed}:{index}"))
+
+def _sudoku_record(args):
+    puzzle, solution, grading = sudoku_puzzle(*args)
+    return SUDOKU_RECORD.pack(bytes(n for row in puzzle for n in row), bytes(n for row in solution for n in row),
+                              DIFFICULTIES.index(grading['difficulty']), min(grading['guesses'], 0xFFFF))
+
+def _write_bank(path, kind, record_size, seed, records, num_remove=0):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, kind, record_size, len(records), seed, num_remove))
+        file.write(b''.join(records))
+    os.replace(tmp_path, path)
+    return path
+
+def build_sudoku_bank(path=SUDOKU_BANK, count=1000, seed=0, num_remove=SUDOKU_NUM_REMOVE, processes=None):
+    """
+    Generate count unique-solution puzzles with their solutions and grades, using a process pool.
+    """
+    jobs = [(index, seed, num_remove) for index in range(count)]
+    with Pool(processes) as pool:
+        records = pool.map(_sudoku_record, jobs, chunksize=64)
+    return _write_bank(path, SUDOKU, SUDOKU_RECORD.size, seed, records, num_remove)
+
+def build_wordle_bank(path=WORDLE_BANK, count=1000, seed=0, word_file='puzzles/wordle.txt'):
+    """
+    Draw count seeded target words from the word list.
+    """
+    words = load_word_store(word_file)
+    rng = random.Random(seed)
+    records = [WORDLE_RECORD.pack(words.random_word(rng).encode('ascii')) for _ in range(count)]
+    return _write_bank(path, WORDLE, WORDLE_RECORD.size, seed, records)
+
+class PuzzleBank:
+    """
+    A memory-mapped bank of pre-generated puzzles. bank[n] unpacks only record n, so any worker can
+    fetch any puzzle in O(1) and every run of the same bank sees exactly the same puzzles.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a puzzle bank of this version, rebuild it with python -m puzzles.bank")
+        _, self.kind, self.record_size, self.count, self.seed, self.num_remove = HEADER.unpack_from(self.buffer)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        if not 0 <= n < self.count:
+            raise IndexError(n)
+        offset = HEADER.size + n * self.record_size
+        if self.kind == SUDOKU:
+            puzzle, solution, difficulty, guesses = SUDOKU_RECORD.unpack_from(self.buffer, offset)
+            return {
+                'index': n,
+                'puzzle': [list(puzzle[r * 9:r * 9 + 9]) for r in range(9)],
+                'solution': [list(solution[r * 9:r * 9 + 9]) for r in range(9)],
+                'difficulty': DIFFICULTIES[difficulty],
+                'guesses': guesses,
+            }
+        if self.kind == WORDLE:
+            target, = WORDLE_RECORD.unpack_from(self.buffer, offset)
+            return {'index': n, 'target': target.decode('ascii')}
+        raise ValueError(f"Unknown puzzle bank kind {self.kind}")
+
+_banks = {}
+_lock = threading.Lock()
+
+def open_bank(path):
+    """
+    The shared bank for a path, mapped once per process. Returns None if the bank was never built.
+    """
+    bank = _banks.get(path)
+    if bank is None:
+        with _lock:
+            bank = _banks.get(path)
+            if bank is None and os.path.exists(path):
+                bank = PuzzleBank(path)
+                _banks[path] = bank
+    return bank
+
+if __name__ == "__main__":
+    # python -m puzzles.bank sudoku|wordle [count] [seed]
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'sudoku'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    path = build_sudoku_bank(count=count, seed=seed) if kind == 'sudoku' else build_wordle_bank(count=count, seed=seed)
+    print(f"Wrote {count} {kind} puzzles with seed {seed} to {path}")
@@ -0,0 +1,172 @@
+import threading
+from utils.dictionary import get_dictionary
+
+EMPTY = '.'  # An unknown cell in a partial grid
+
+class Trie:
+    """
+    A prefix tree of equal-length words, as nested dicts of letter -> node. The empty string key
+    marks the end of a word.
+    """
+    def __init__(self, words=()):
+        self.root = {}
+        for word in words:
+            self.insert(word)
+
+    def insert(self, word):
+        node = self.root
+        for letter in word:
+            node = node.setdefault(letter, {})
+        node[''] = True
+
+    def node(self, prefix):
+        """
+        The node reached by prefix, or None if no word starts with it.
+        """
+        node = self.root
+        for letter in prefix:
+            node = node.get(letter)
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, word):
+        node = self.node(word)
+        return node is not None and '' in node
+
+_tries = {}
+_lock = threading.Lock()
+
+def get_trie(length):
+    """
+    The shared trie of upper-case valid words of one length, built once per process. Raises
+    LookupError if no word list has words of that length, as an empty trie would make every grid
+    look impossible.
+    """
+    trie = _tries.get(length)
+    if trie is None:
+        with _lock:
+            trie = _tries.get(length)
+            if trie is None:
+                words = {word.upper() for word in get_dictionary().words_of_length(length) if word.isalpha()}
+                if not words:
+                    raise LookupError(f"No word list has {length}-letter words. Install one at /usr/share/dict/words or point WORDLIST_PATH at one.")
+                trie = Trie(sorted(words))
+                _tries[length] = trie
+    return trie
+
+def grid_lines(words):
+    """
+    The row words of a grid as given, and the column words read down them. Columns are only read when
+    the grid is square.
+    """
+    rows = [word.strip().upper() for word in words]
+    if not rows or any(len(row) != len(rows) for row in rows):
+        return rows, []
+    return rows, [''.join(row[c] for row in rows) for c in range(len(rows))]
+
+def _check_ends(rows, row_valid, first_letter, last_letter):
+    """
+    Mark the first row invalid unless it starts with first_letter, and the last unless it ends with
+    last_letter.
+    """
+    if rows and not (rows[0] or '').startswith(first_letter):
+        row_valid[0] = False
+    if rows and not (rows[-1] or '').endswith(last_letter):
+        row_valid[-1] = False
+    return row_valid
+
+def validate_grid(words, first_letter='C', last_letter='N', size=None):
+    """
+    Grade a whole grid in one pass: every row and column word is checked against the shared
+    dictionary, along with the first-word and last-word constraints. With a size, a grid that is
+    not size x size is invalid, however good its words.
+
+    Returns a dict with the validity of each row and column, the (row, col) cells that sit in an
+    invalid row or column, and whether the whole grid is valid.
+    """
+    rows, columns = grid_lines(words)
+    square = bool(columns) and (size is None or len(rows) == size)
+    validity = get_dictionary().validate_many({line.lower() for line in rows + columns})
+    row_valid = _check_ends(rows, [validity[row.lower()] and square for row in rows], first_letter, last_letter)
+    column_valid = [validity[column.lower()] for column in columns]
+    conflicts = [(r, c) for r in range(len(rows)) for c in range(len(rows[r])) if not row_valid[r] or (square and not column_valid[c])]
+    return {
+        'rows': list(zip(rows, row_valid)),
+        'columns': list(zip(columns, column_valid)),
+        'conflicts': conflicts,
+        'square': square,
+        'valid': square and all(row_valid) and all(column_valid),
+    }
+
+def complete_grid(partial, size, first_letter='C', last_letter='N', max_nodes=1000000):
+    """
+    Fill the unknown cells of a partial grid so that every row and column is a valid word, the first
+    word starts with first_letter and the last word ends with last_letter.
+
+    Args:
+        partial: size strings of size letters, with EMPTY (or None for a whole row) where unknown.
+        max_nodes: Give up after trying this many letters.
+
+    Returns:
+        The completed rows, None if no completion exists, or False if max_nodes ran out first.
+    """
+    trie = get_trie(size)
+    fixed = [(row or EMPTY * size).upper() for row in partial]
+    if fixed[0][0] not in (EMPTY, first_letter) or fixed[-1][-1] not in (EMPTY, last_letter):
+        return None  # A given letter breaks the first-word or last-word constraint
+    cells = [[None] * size for _ in range(size)]
+    row_nodes = [trie.root] * size
+    column_nodes = [trie.root] * size
+    nodes = [0]
+
+    def allowed(r, c):
+        if fixed[r][c] != EMPTY:
+            return fixed[r][c]
+        if (r, c) == (0, 0):
+            return first_letter
+        if (r, c) == (size - 1, size - 1):
+            return last_letter
+        return None
+
+    def fill(i):
+        if i == size * size:
+            return True
+        r, c = divmod(i, size)
+        row_node, column_node = row_nodes[r], column_nodes[c]
+        letters = [allowed(r, c)] if allowed(r, c) else [letter for letter in row_node if letter and letter in column_node]
+        for letter in letters:
+            next_row, next_column = row_node.get(letter), column_node.get(letter)
+            if next_row is None or next_column is None:
+                continue
+            # A finished row or column has to end on a word
+            if (c == size - 1 and '' not in next_row) or (r == size - 1 and '' not in next_column):
+                continue
+            nodes[0] += 1
+            if nodes[0] > max_nodes:
+                raise TimeoutError
+            cells[r][c] = letter
+            row_nodes[r], column_nodes[c] = next_row, next_column
+            if fill(i + 1):
+                return True
+            row_nodes[r], column_nodes[c] = row_node, column_node
+        return False
+
+    try:
+        return [''.join(row) for row in cells] if fill(0) else None
+    except TimeoutError:
+        return False
+
+def can_complete(words, size=None, first_letter='C', last_letter='N', **kwargs):
+    """
+    Whether the valid rows of an LLM grid can be kept and the other rows refilled to a valid grid.
+    A row is kept if it passes the same row check as validate_grid, first-word and last-word
+    constraints included.
+    """
+    size = size or len(words)
+    rows = [word.strip().upper() for word in words][:size]
+    rows += [None] * (size - len(rows))
+    validity = get_dictionary().validate_many({row.lower() for row in rows if row})
+    row_valid = _check_ends(rows, [bool(row) and len(row) == size and validity[row.lower()] for row in rows], first_letter, last_letter)
+    partial = [row if valid else None for row, valid in zip(rows, row_valid)]
+    return bool(complete_grid(partial, size, first_letter, last_letter, **kwargs))
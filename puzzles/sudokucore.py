@@ -0,0 +1,213 @@
+import random
+
+ALL_DIGITS = 0x3FE  # Bits 1-9 set, bit n means digit n
+BIT_COUNT = [bin(mask).count('1') for mask in range(1 << 10)]
+DIGITS = [[n for n in range(1, 10) if mask >> n & 1] for mask in range(1 << 10)]
+ROW = [i // 9 for i in range(81)]
+COL = [i % 9 for i in range(81)]
+BOX = [3 * (i // 27) + (i % 9) // 3 for i in range(81)]
+# The 27 units (rows, columns, boxes) as lists of cell indices
+UNITS = [[r * 9 + c for c in range(9)] for r in range(9)] + \
+        [[r * 9 + c for r in range(9)] for c in range(9)] + \
+        [[(3 * (b // 3) + r) * 9 + 3 * (b % 3) + c for r in range(3) for c in range(3)] for b in range(9)]
+
+class SudokuGrid:
+    """
+    A Sudoku board with row, column and box bitmasks of the digits already used, so the candidates
+    of a cell are a couple of bit operations instead of a scan.
+
+    Cells are numbered 0-80 in row order. Every placement made during a search is recorded on a
+    trail so it can be undone cheaply when backtracking.
+    """
+    def __init__(self, board):
+        self.cells = [0] * 81
+        self.rows = [0] * 9
+        self.cols = [0] * 9
+        self.boxes = [0] * 9
+        for i in range(81):
+            n = board[i // 9][i % 9]
+            if n:
+                if not self.candidates(i) >> n & 1:
+                    raise ValueError(f"Digit {n} at ({i // 9 + 1}, {i % 9 + 1}) clashes with another given")
+                self.place(i, n)
+
+    def candidates(self, i):
+        return ALL_DIGITS & ~(self.rows[ROW[i]] | self.cols[COL[i]] | self.boxes[BOX[i]])
+
+    def place(self, i, n):
+        bit = 1 << n
+        self.cells[i] = n
+        self.rows[ROW[i]] |= bit
+        self.cols[COL[i]] |= bit
+        self.boxes[BOX[i]] |= bit
+
+    def remove(self, i):
+        bit = ~(1 << self.cells[i])
+        self.cells[i] = 0
+        self.rows[ROW[i]] &= bit
+        self.cols[COL[i]] &= bit
+        self.boxes[BOX[i]] &= bit
+
+    def undo(self, trail, mark=0):
+        while len(trail) > mark:
+            self.remove(trail.pop())
+
+    def propagate(self, trail, stats=None, hidden=True):
+        """
+        Fill naked singles (a cell with one candidate) and, unless hidden is False, hidden singles
+        (a digit with one place in a unit) until neither applies. Returns False on a contradiction.
+        """
+        changed = True
+        while changed:
+            changed = False
+            for i in range(81):
+                if self.cells[i]:
+                    continue
+                mask = self.candidates(i)
+                if not mask:
+                    return False
+                if BIT_COUNT[mask] == 1:
+                    self.place(i, DIGITS[mask][0])
+                    trail.append(i)
+                    changed = True
+                    if stats is not None:
+                        stats['naked_singles'] += 1
+            if not hidden:
+                continue
+            for unit in UNITS:
+                seen_once, seen_twice, filled = 0, 0, 0
+                for i in unit:
+                    if self.cells[i]:
+                        filled |= 1 << self.cells[i]
+                    else:
+                        mask = self.candidates(i)
+                        seen_twice |= seen_once & mask
+                        seen_once |= mask
+                if (seen_once | filled) != ALL_DIGITS:
+                    return False  # Some digit has nowhere to go in this unit
+                singles = seen_once & ~seen_twice & ~filled
+                if not singles:
+                    continue
+                for i in unit:
+                    if not self.cells[i]:
+                        mask = self.candidates(i) & singles
+                        if mask:
+                            if BIT_COUNT[mask] > 1:
+                                return False  # Two digits both need this cell
+                            self.place(i, DIGITS[mask][0])
+                            trail.append(i)
+                            changed = True
+                            if stats is not None:
+                                stats['hidden_singles'] += 1
+        return True
+
+    def most_constrained_cell(self):
+        """
+        The empty cell with the fewest candidates, or None when the board is full.
+        """
+        best, best_count = None, 10
+        for i in range(81):
+            if not self.cells[i]:
+                count = BIT_COUNT[self.candidates(i)]
+                if count < best_count:
+                    best, best_count = i, count
+                    if count <= 1:
+                        break
+        return best
+
+    def search(self, rng=None, stats=None):
+        """
+        Depth-first search with propagation and the most-constrained-cell heuristic. Leaves the
+        solution in place and returns True, or restores the board and returns False.
+        """
+        trail = []
+        if not self.propagate(trail, stats):
+            self.undo(trail)
+            return False
+        i = self.most_constrained_cell()
+        if i is None:
+            return True
+        digits = list(DIGITS[self.candidates(i)])
+        if rng is not None:
+            rng.shuffle(digits)
+        for n in digits:
+            if stats is not None:
+                stats['guesses'] += 1
+            self.place(i, n)
+            if self.search(rng, stats):
+                return True
+            self.remove(i)
+        self.undo(trail)
+        return False
+
+    def count_solutions(self, limit=2):
+        """
+        Count solutions, stopping as soon as limit are found. The board is left unchanged.
+        """
+        trail = []
+        if not self.propagate(trail):
+            self.undo(trail)
+            return 0
+        i = self.most_constrained_cell()
+        if i is None:
+            self.undo(trail)
+            return 1
+        count = 0
+        for n in DIGITS[self.candidates(i)]:
+            self.place(i, n)
+            count += self.count_solutions(limit - count)
+            self.remove(i)
+            if count >= limit:
+                break
+        self.undo(trail)
+        return count
+
+    def is_full(self):
+        return all(self.cells)
+
+    def to_board(self):
+        return [self.cells[r * 9:r * 9 + 9] for r in range(9)]
+
+def solve(board, rng=None):
+    """
+    Solve a board given as 9 lists of 9 ints (0 for empty). Returns the solved board, or None if the
+    board has no solution. Pass a random.Random as rng to pick among solutions at random.
+    """
+    try:
+        grid = SudokuGrid(board)
+    except ValueError:
+        return None
+    return grid.to_board() if grid.search(rng) else None
+
+def count_solutions(board, limit=2):
+    """
+    Number of solutions of a board, capped at limit. count_solutions(board) == 1 means unique.
+    """
+    try:
+        grid = SudokuGrid(board)
+    except ValueError:
+        return 0
+    return grid.count_solutions(limit)
+
+def grade(board):
+    """
+    Grade a puzzle by the techniques needed to solve it:
+    'easy' needs only naked singles, 'medium' also needs hidden singles and 'hard' needs guessing.
+    Returns a dict with the difficulty and the number of guesses the search made.
+    """
+    stats = {'naked_singles': 0, 'hidden_singles': 0, 'guesses': 0}
+    grid = SudokuGrid(board)
+    grid.propagate([], stats, hidden=False)
+    if grid.is_full():
+        return {'difficulty': 'easy', **stats}
+    grid.propagate([], stats)
+    if grid.is_full():
+        return {'difficulty': 'medium', **stats}
+    grid.search(stats=stats)
+    return {'difficulty': 'hard', **stats}
+
+def random_full_board(rng=random):
+    """
+    A random, completely filled valid board.
+    """
+    return solve([[0] * 9 for _ in range(9)], rng)
@@ -1,4 +1,5 @@
 import random
+from puzzles.sudokucore import SudokuGrid, random_full_board, grade
 
 def is_valid_move(board, row, col, num):
     ''' 
@@ -15,17 +16,18 @@ def is_valid_move(board, row, col, num):
     return True
 
 def solve_sudoku(board):
-    empty_cell = find_empty_location(board)
-    if not empty_cell:
-        return True  # Puzzle solved
-    row, col = empty_cell
-    for num in range(1, 10):
-        if is_valid_move(board, row, col, num):
-            board[row][col] = num
-            if solve_sudoku(board):
-                return True
-            board[row][col] = 0  # Backtrack
-    return False
+    '''
+    Solve the board in place with the bitmask engine. Returns False if it has no solution.
+    '''
+    try:
+        grid = SudokuGrid(board)
+    except ValueError:
+        return False
+    if not grid.search():
+        return False
+    for row in range(9):
+        board[row][:] = grid.cells[row * 9:row * 9 + 9]
+    return True
 
 def find_empty_location(board):
     for i in range(9):
@@ -34,28 +36,44 @@ def find_empty_location(board):
                 return i, j
     return None
 
-def remove_numbers_from_board(board, num_remove):
+def remove_numbers_from_board(board, num_remove, rng=random):
     count = 0
     while count < num_remove:
-        row = random.randint(0, 8)
-        col = random.randint(0, 8)
+        row = rng.randint(0, 8)
+        col = rng.randint(0, 8)
         while board[row][col] == 0:  # Find a cell that is not already empty
-            row = random.randint(0, 8)
-            col = random.randint(0, 8)
+            row = rng.randint(0, 8)
+            col = rng.randint(0, 8)
         board[row][col] = 0
         count += 1
 
-def generate_sudoku(num_remove):
-    board = [[0 for _ in range(9)] for _ in range(9)]
-    for i in range(1, 10):
-        row, col = random.randint(0, 8), random.randint(0, 8)
-        while not is_valid_move(board,row, col, i):
-            row, col = random.randint(0, 8), random.randint(0, 8)
-        board[row][col] = i
-    solve_sudoku(board)
-    remove_numbers_from_board(board, num_remove)
+def generate_sudoku(num_remove, rng=random):
+    board = random_full_board(rng)
+    remove_numbers_from_board(board, num_remove, rng)
     return board
 
+def generate_unique_sudoku(num_remove, rng=random):
+    '''
+    Remove up to num_remove clues, in random order, keeping only removals that leave exactly one
+    solution. Returns (puzzle, solution, grading), where grading is the dict from sudokucore.grade.
+    '''
+    solution = random_full_board(rng)
+    grid = SudokuGrid(solution)  # Clues are removed from and restored to this one grid in place
+    cells = list(range(81))
+    rng.shuffle(cells)
+    removed = 0
+    for i in cells:
+        if removed >= num_remove:
+            break
+        value = grid.cells[i]
+        grid.remove(i)
+        if grid.count_solutions(limit=2) == 1:
+            removed += 1
+        else:
+            grid.place(i, value)  # Removing this clue makes the puzzle ambiguous
+    board = grid.to_board()
+    return board, solution, grade(board)
+
 if __name__ == "__main__":
     sudoku = generate_sudoku(10)
     for row in sudoku:
@@ -0,0 +1,162 @@
+import os
+import json
+import threading
+import numpy as np
+from puzzles.gridvalidator import get_trie
+
+INDEX_PATH = 'puzzles/wordgrid_{size}.npy'
+MAX_SOLUTIONS = 2000000  # Caps the size of an index, at size * size bytes per grid
+UNKNOWN = 255  # Code of a missing cell, never equal to a letter
+
+def enumerate_grids(size, first_letter='C', last_letter='N', limit=MAX_SOLUTIONS):
+    """
+    Yield every size x size grid, as a string of size * size upper-case letters in row order, whose
+    rows and columns are all valid words, with the first word starting with first_letter and the
+    last word ending with last_letter.
+
+    Cells are filled in row order, and a letter is only tried if it extends both the row prefix and
+    the column prefix in the trie, so dead branches are cut as early as possible.
+    """
+    trie = get_trie(size)
+    cells = [None] * (size * size)
+    row_nodes = [trie.root] * size
+    column_nodes = [trie.root] * size
+    found = 0
+
+    def fill(i):
+        nonlocal found
+        if i == size * size:
+            found += 1
+            yield ''.join(cells)
+            return
+        r, c = divmod(i, size)
+        row_node, column_node = row_nodes[r], column_nodes[c]
+        if i == 0:
+            letters = [first_letter]
+        elif i == size * size - 1:
+            letters = [last_letter]
+        else:
+            letters = [letter for letter in row_node if letter and letter in column_node]
+        for letter in letters:
+            next_row, next_column = row_node.get(letter), column_node.get(letter)
+            if next_row is None or next_column is None:
+                continue
+            if (c == size - 1 and '' not in next_row) or (r == size - 1 and '' not in next_column):
+                continue
+            cells[i] = letter
+            row_nodes[r], column_nodes[c] = next_row, next_column
+            yield from fill(i + 1)
+            row_nodes[r], column_nodes[c] = row_node, column_node
+            if found >= limit:
+                return
+
+    yield from fill(0)
+
+def encode_grid(words, size):
+    """
+    A grid as a (size * size,) uint8 array of letter codes, 'A' -> 0. Missing rows and letters, or
+    rows that are too short, are UNKNOWN; extra rows and letters are dropped.
+    """
+    codes = np.full((size, size), UNKNOWN, dtype=np.uint8)
+    for r, word in enumerate(words[:size]):
+        letters = [ord(letter) - ord('A') for letter in str(word).strip().upper()[:size]]
+        codes[r, :len(letters)] = [code if 0 <= code < 26 else UNKNOWN for code in letters]
+    return codes.ravel()
+
+def build_index(size, path=None, limit=MAX_SOLUTIONS):
+    """
+    Enumerate the valid grids of one size and save them as an (N, size * size) uint8 array. If there
+    are more than limit, only the first limit are kept. path + '.json' records how many grids the
+    index holds and whether it was truncated.
+    """
+    path = path or INDEX_PATH.format(size=size)
+    letters = ''.join(enumerate_grids(size, limit=limit + 1))
+    truncated = len(letters) > limit * size * size
+    grids = np.frombuffer(letters[:limit * size * size].encode('ascii'), dtype=np.uint8)
+    np.save(path, (grids - ord('A')).reshape(-1, size * size))
+    with open(path + '.json', 'w') as file:
+        json.dump({'count': len(grids) // (size * size), 'truncated': truncated}, file)
+    if truncated:
+        print(f"Warning: stopped after {limit} valid {size}x{size} grids, the index at {path} is incomplete.")
+    return path
+
+def index_truncated(size, path=None):
+    """
+    Whether the index of one size was cut short at its limit, so that it holds only some of the
+    valid grids. An index without a record of it counts as truncated.
+    """
+    path = path or INDEX_PATH.format(size=size)
+    try:
+        with open(path + '.json', 'r') as file:
+            return json.load(file)['truncated']
+    except (OSError, ValueError, KeyError):
+        return True
+
+_indexes = {}
+_lock = threading.Lock()
+
+def load_index(size, path=None):
+    """
+    The solution index of one size, memory-mapped from path and built the first time.
+    """
+    path = path or INDEX_PATH.format(size=size)
+    index = _indexes.get(path)
+    if index is None:
+        with _lock:
+            index = _indexes.get(path)
+            if index is None:
+                if not os.path.exists(path):
+                    build_index(size, path)
+                index = np.load(path, mmap_mode='r')
+                _indexes[path] = index
+    return index
+
+def decode_grid(codes, size):
+    letters = bytes(int(code) + ord('A') for code in codes).decode('ascii')
+    return [letters[r * size:(r + 1) * size] for r in range(size)]
+
+def nearest_solution(words, size, index=None, chunk_size=65536):
+    """
+    The valid grid closest to an LLM matrix. As every grid has the same shape, the edit distance is
+    the number of cells that need changing, computed against the whole index in chunks.
+
+    Returns (distance, grid as a list of words), or (None, None) if the index is empty. For a
+    truncated index, the distance is only an upper bound.
+    """
+    index = load_index(size) if index is None else index
+    query = encode_grid(words, size)
+    best_distance, best = None, None
+    for start in range(0, len(index), chunk_size):
+        distances = (index[start:start + chunk_size] != query).sum(axis=1)
+        i = int(np.argmin(distances))
+        if best_distance is None or distances[i] < best_distance:
+            best_distance, best = int(distances[i]), start + i
+    if best is None:
+        return None, None
+    return best_distance, decode_grid(index[best], size)
+
+def score_results(results):
+    """
+    Add the distance to the nearest valid grid to every run of a results_wg.json layout, in place,
+    and whether it is exact, i.e. the index holds every valid grid.
+    """
+    for objectives in results.values():
+        for matrix_key, attempts in objectives.items():
+            size = int(matrix_key.rsplit('_', 1)[1])
+            index = load_index(size)
+            truncated = index_truncated(size)
+            for attempt in attempts:
+                for run in attempt['runs']:
+                    if isinstance(run.get('matrix'), list):
+                        run['nearest_distance'], run['nearest_solution'] = nearest_solution(run['matrix'], size, index)
+                        run['nearest_exact'] = not truncated
+    return results
+
+if __name__ == "__main__":
+    for size in (3, 4, 5):
+        count = len(load_index(size))
+        print(f"{'At least ' if index_truncated(size) else ''}{count} valid {size}x{size} grids start with C and end with N.")
+    with open('results/results_wg.json', 'r') as file:
+        results = score_results(json.load(file))
+    with open('results/wordgrid_nearest.json', 'w') as file:
+        json.dump(results, file, indent=4)
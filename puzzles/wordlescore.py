@@ -0,0 +1,70 @@
+import numpy as np
+
+WORD_LENGTH = 5
+GREY, YELLOW, GREEN = 0, 1, 2
+SYMBOLS = {GREY: '_', YELLOW: 'Y', GREEN: 'G'}
+POWERS = 3 ** np.arange(WORD_LENGTH, dtype=np.uint8)  # Position i contributes colour * 3**i
+ALL_GREEN = int((GREEN * POWERS.astype(np.int64)).sum())  # 242
+EARLIER = np.tril(np.ones((WORD_LENGTH, WORD_LENGTH), dtype=bool), k=-1)  # EARLIER[i, j] is j < i
+
+def encode_words(words):
+    """
+    Encode words as an (N, 5) uint8 array of letter indices, 'a' -> 0.
+    """
+    joined = ''.join(word.lower() for word in words).encode('ascii')
+    return (np.frombuffer(joined, dtype=np.uint8) - ord('a')).reshape(-1, WORD_LENGTH)
+
+def pattern_code(gys):
+    """
+    The code of a colorize_guess pattern string such as 'G_Y__'.
+    """
+    colours = {'_': GREY, 'Y': YELLOW, 'G': GREEN}
+    return sum(colours[symbol] * 3 ** i for i, symbol in enumerate(gys))
+
+def decode_pattern(code):
+    """
+    The colorize_guess pattern string of a code.
+    """
+    symbols = []
+    for _ in range(WORD_LENGTH):
+        code, colour = divmod(int(code), 3)
+        symbols.append(SYMBOLS[colour])
+    return ''.join(symbols)
+
+def _score_chunk(guesses, targets):
+    g = guesses[:, None, :]  # (G, 1, 5)
+    t = targets[None, :, :]  # (1, T, 5)
+    green = g == t  # (G, T, 5)
+    unused = ~green
+    # For each guess position, how many non-green target letters match it...
+    available = ((g[:, :, :, None] == t[:, :, None, :]) & unused[:, :, None, :]).sum(axis=-1)
+    # ...and how many earlier non-green guess positions already claimed the same letter
+    claimed = ((g[:, :, :, None] == g[:, :, None, :]) & unused[:, :, None, :] & EARLIER).sum(axis=-1)
+    yellow = unused & (available > claimed)
+    colours = np.where(green, GREEN, np.where(yellow, YELLOW, GREY)).astype(np.uint8)
+    return (colours * POWERS).sum(axis=-1, dtype=np.uint8)
+
+def score_matrix(guesses, targets, chunk_size=256):
+    """
+    Score every guess against every target in one go.
+
+    Args:
+        guesses, targets: Lists of words or (N, 5) arrays from encode_words.
+        chunk_size: Guesses scored per step, which bounds the memory used.
+
+    Returns:
+        A (len(guesses), len(targets)) uint8 array of pattern codes, identical to scoring each pair
+        with colorize_guess, including repeated letters.
+    """
+    guesses = guesses if isinstance(guesses, np.ndarray) else encode_words(guesses)
+    targets = targets if isinstance(targets, np.ndarray) else encode_words(targets)
+    patterns = np.empty((len(guesses), len(targets)), dtype=np.uint8)
+    for start in range(0, len(guesses), chunk_size):
+        patterns[start:start + chunk_size] = _score_chunk(guesses[start:start + chunk_size], targets)
+    return patterns
+
+def score(guess, target):
+    """
+    Pattern string of a single guess against a single target, like the first value of colorize_guess.
+    """
+    return decode_pattern(score_matrix([guess], [target])[0, 0])
@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from puzzles.wordstore import load_word_store
+from puzzles.wordlescore import score_matrix, decode_pattern, ALL_GREEN
+
+NUM_PATTERNS = 3 ** 5
+TABLE_PATH = 'puzzles/wordle_patterns.npy'
+
+_tables = {}
+_lock = threading.Lock()
+
+def load_pattern_table(words, path=TABLE_PATH):
+    """
+    The guess x target pattern table for a word list, memory-mapped from path. It is computed and
+    saved the first time, or again if the word list changed. path + '.json' records a hash of the
+    word list the table was computed for.
+    """
+    table = _tables.get(path)
+    if table is None:
+        with _lock:
+            table = _tables.get(path)
+            if table is None:
+                digest = hashlib.sha1('\n'.join(words).encode('utf-8')).hexdigest()
+                try:
+                    with open(path + '.json', 'r') as file:
+                        saved = json.load(file).get('words_sha1')
+                except (OSError, ValueError):
+                    saved = None
+                if saved == digest and os.path.exists(path):
+                    table = np.load(path, mmap_mode='r')
+                if table is None or table.shape != (len(words), len(words)):
+                    np.save(path, score_matrix(words, words))
+                    with open(path + '.json', 'w') as file:
+                        json.dump({'words_sha1': digest, 'count': len(words)}, file)
+                    table = np.load(path, mmap_mode='r')
+                _tables[path] = table
+    return table
+
+def entropy_of_counts(counts, total):
+    """
+    Shannon entropy in bits of each row of pattern counts.
+    """
+    p = counts / total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=-1)
+
+class WordleSolver:
+    """
+    An information-theoretic Wordle baseline over puzzles/wordle.txt.
+
+    Candidates are pruned incrementally with the precomputed pattern table, and the best guess is the
+    one whose feedback pattern has the highest entropy over the remaining candidates.
+    """
+    def __init__(self, file_path='puzzles/wordle.txt', table_path=TABLE_PATH):
+        self.words = load_word_store(file_path).words
+        self.position = {word: i for i, word in enumerate(self.words)}
+        self.table = load_pattern_table(self.words, table_path)
+        self.opening_entropies = None  # Every game starts from the same candidates, so compute this once
+        self.reset()
+
+    def reset(self):
+        self.candidates = np.arange(len(self.words))
+
+    def entropies(self):
+        """
+        Expected information, in bits, of every guess in the word list against the current candidates.
+        """
+        if len(self.candidates) == len(self.words) and self.opening_entropies is not None:
+            return self.opening_entropies
+        patterns = self.table[:, self.candidates].astype(np.int64)
+        offsets = np.arange(len(self.words))[:, None] * NUM_PATTERNS
+        counts = np.bincount((patterns + offsets).ravel(), minlength=len(self.words) * NUM_PATTERNS)
+        entropies = entropy_of_counts(counts.reshape(len(self.words), NUM_PATTERNS), len(self.candidates))
+        if len(self.candidates) == len(self.words):
+            self.opening_entropies = entropies
+        return entropies
+
+    def best_guess(self, entropies=None):
+        """
+        The highest-entropy guess, preferring a word that could still be the answer on ties.
+        Returns (word, entropy).
+        """
+        if len(self.candidates) == 1:
+            return self.words[self.candidates[0]], 0.0
+        entropies = self.entropies() if entropies is None else entropies
+        bonus = np.zeros(len(self.words))
+        bonus[self.candidates] = 1e-9
+        best = int(np.argmax(entropies + bonus))
+        return self.words[best], float(entropies[best])
+
+    def update(self, guess, pattern):
+        """
+        Keep only the candidates that would have given pattern (a code) for guess.
+        """
+        self.candidates = self.candidates[self.table[self.position[guess], self.candidates] == pattern]
+
+def split_games(results):
+    """
+    Group the flat rows of results_wordle.json into games by run, LLM and game number. Rows recorded
+    before games were numbered start a new game when the run, LLM or target changes, or the turn
+    number stops increasing.
+    """
+    games, numbered, previous = [], {}, None
+    for row in results:
+        if row.get('Game #') is not None:
+            key = (row['Global attempt #'], row['LLM type'], row['Game #'])
+            if key not in numbered:
+                numbered[key] = []
+                games.append(numbered[key])
+            numbered[key].append(row)
+            previous = None
+            continue
+        if previous is None or (row['Global attempt #'], row['LLM type'], row['Target word']) != (previous['Global attempt #'], previous['LLM type'], previous['Target word']) or row['Run #'] <= previous['Run #']:
+            games.append([])
+        games[-1].append(row)
+        previous = row
+    return games
+
+def analyse_game(solver, rows):
+    """
+    Compare every logged guess of one game with the solver's choice from the same feedback.
+    """
+    solver.reset()
+    target = rows[0]['Target word']
+    turns = []
+    for row in rows:
+        guess = row['Guessed word']
+        if guess not in solver.position or target not in solver.position:
+            break
+        entropies = solver.entropies()
+        optimal_guess, optimal_entropy = solver.best_guess(entropies)
+        candidates_before = len(solver.candidates)
+        pattern = int(solver.table[solver.position[guess], solver.position[target]])
+        solver.update(guess, pattern)
+        turns.append({
+            'turn': row['Run #'],
+            'guess': guess,
+            'pattern': decode_pattern(pattern),
+            'candidates_before': candidates_before,
+            'candidates_after': len(solver.candidates),
+            'uncertainty_bits': float(np.log2(candidates_before)),
+            'guess_entropy': float(entropies[solver.position[guess]]),
+            'information_gained': float(np.log2(candidates_before / max(len(solver.candidates), 1))),
+            'optimal_guess': optimal_guess,
+            'optimal_entropy': optimal_entropy,
+        })
+        if pattern == ALL_GREEN:
+            break
+    return {'run': rows[0]['Global attempt #'], 'llm_type': rows[0]['LLM type'], 'target': target, 'turns': turns}
+
+def analyse_results(results, solver=None):
+    solver = solver or WordleSolver()
+    return [analyse_game(solver, rows) for rows in split_games(results)]
+
+if __name__ == "__main__":
+    with open('results/results_wordle.json', 'r') as file:
+        results = json.load(file)
+    games = analyse_results(results)
+    turns = [turn for game in games for turn in game['turns']]
+    if turns:
+        print(f"{len(games)} games, {len(turns)} turns analysed.")
+        print(f"Average entropy of LLM guesses: {np.mean([turn['guess_entropy'] for turn in turns]):.2f} bits")
+        print(f"Average entropy of optimal guesses: {np.mean([turn['optimal_entropy'] for turn in turns]):.2f} bits")
+    with open('results/wordle_solver_baseline.json', 'w') as file:
+        json.dump(games, file, indent=4)
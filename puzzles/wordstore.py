@@ -0,0 +1,94 @@
+import os
+import mmap
+import random
+import struct
+import threading
+
+MAGIC = b'LOOPWRD1'
+HEADER = struct.Struct('<8sHI')  # magic, word length, word count
+
+class WordStore:
+    """
+    A read-only list of fixed-length words with a hash index, shared by every game in a process.
+
+    Words are kept either as a tuple (loaded from text) or in a memory-mapped compiled file, where
+    word i is the bytes at HEADER.size + i * length and is only decoded when asked for.
+    """
+    def __init__(self, length, words=None, buffer=None, count=0):
+        self.length = length
+        self._words = tuple(words) if words is not None else None
+        self._buffer = buffer
+        self._count = len(self._words) if self._words is not None else count
+        self.index = frozenset(self._words if self._words is not None else (self[i] for i in range(count)))
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if self._words is not None:
+            return self._words[i]
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        start = HEADER.size + i * self.length
+        return self._buffer[start:start + self.length].decode('ascii')
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __iter__(self):
+        return (self[i] for i in range(self._count))
+
+    @property
+    def words(self):
+        return self._words if self._words is not None else tuple(self)
+
+    def random_word(self, rng=random):
+        return self[rng.randrange(self._count)]
+
+def read_words(path, length=5):
+    with open(path, 'r') as file:
+        return [line.strip().lower() for line in file if len(line.strip()) == length]
+
+def compile_word_store(path, compiled_path=None, length=5):
+    """
+    Write the words of a text word list as a compact binary file that can be memory-mapped.
+    """
+    compiled_path = compiled_path or path + '.bin'
+    words = read_words(path, length)
+    with open(compiled_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, length, len(words)))
+        file.write(''.join(words).encode('ascii'))
+    return compiled_path
+
+def _open_compiled(compiled_path):
+    with open(compiled_path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, length, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{compiled_path} is not a compiled word list")
+    return WordStore(length, buffer=buffer, count=count)
+
+_stores = {}
+_lock = threading.Lock()
+
+def load_word_store(path='puzzles/wordle.txt', length=5):
+    """
+    The shared store for a word list, loaded once per process. A compiled path + '.bin' that is
+    newer than the text list is memory-mapped instead of parsing the text.
+    """
+    key = (path, length)
+    store = _stores.get(key)
+    if store is None:
+        with _lock:
+            store = _stores.get(key)
+            if store is None:
+                compiled_path = path + '.bin'
+                if os.path.exists(compiled_path) and os.path.getmtime(compiled_path) >= os.path.getmtime(path):
+                    store = _open_compiled(compiled_path)
+                if store is None or store.length != length:
+                    store = WordStore(length, words=read_words(path, length))
+                _stores[key] = store
+    return store
+
+if __name__ == "__main__":
+    print(f"Compiled word list to {compile_word_store('puzzles/wordle.txt')}")
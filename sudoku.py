@@ -1,16 +1,17 @@
 import os
-import re
 import json
 import openai
 import enchant
 from dotenv import load_dotenv
 load_dotenv()
-from llms.llms import llm_call
+from llms.llms import llm_call_gpt
+from llms.tracing import trace_context
 from utils.retry import retry_except
-from puzzles.sudokugen import generate_sudoku, is_valid_move, find_empty_location
-from sudokusolve import encode_sudoku, decode_solution, transpose, solve_sudoku_with_explanation
-from pysat.formula import CNF
-from pysat.solvers import Glucose3
+from utils.runner import run_games
+from utils.parsing import parse_int_list
+from utils.ratelimit import configure_limits
+from puzzles.bank import open_bank, sudoku_puzzle, SUDOKU_BANK
+from sudokusolve import solve_sudoku_with_explanation, solve_with_sat, new_stats
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 with open('info.json', 'r') as file:
@@ -22,12 +23,14 @@ small_change = data.get('small_change_wg')
 GPT = data.get('GPT_MODEL')
 ATTEMPTS = 10
 THRESHOLD = 10
+CONCURRENCY = data.get('CONCURRENCY', {})
+configure_limits(data.get('RATE_LIMITS'))
 
 def create_sudoku(sudoku, objective):
     """
     Generate a sudoku matrix.
     """
-    response = llm_call(f"""
+    response = llm_call_gpt(f"""
                         {instructions}. Objective is: {objective}. Given the following sudoku matrix, please analyse and reply with the number that would satisfy the answer. Sudoku is here: {sudoku}. Answer in the following format.
                         ```
                         Number, Number, etc
@@ -40,8 +43,9 @@ def create_sudoku_row(sudoku, objective):
     Generate a sudoku matrix.
     """
     response = []
-    for row in sudoku:
-        response_row = llm_call(f"""{instructions}. Objective is: {objective}. Given the following sudoku matrix, please analyse and reply with the number that would satisfy the answer. Sudoku is here: {sudoku}. Solve this row: {row}. Answer in the following format.
+    for row_index, row in enumerate(sudoku):
+        with trace_context(turn=row_index + 1):
+            response_row = llm_call_gpt(f"""{instructions}. Objective is: {objective}. Given the following sudoku matrix, please analyse and reply with the number that would satisfy the answer. Sudoku is here: {sudoku}. Solve this row: {row}. Answer in the following format.
             ```
             Number, Number, etc
             ```
@@ -63,20 +67,9 @@ def solve_sudoku(board, replacements):
         return "Too many replacement numbers provided."
     return board
 
-def parse_response_to_int_list(response):
-    # Use regular expression to find all number sequences in the response.
-    numbers = re.findall(r'\d+', response.strip("` \n"))
-    # Convert found number strings to integers.
-    return [int(num) for num in numbers]
-
 def check_solution(sudoku):
-    cnf = encode_sudoku(sudoku)
-    solver = Glucose3()
-    solver.append_formula(cnf)
-    if solver.solve():
-        model = solver.get_model()
-        solution = decode_solution(model)
-        solution = transpose(solution) # Because somehow I swtiched row and columns around
+    solution = solve_with_sat(sudoku)
+    if solution:
         print("\nSAT Solver Solution")
         for row in solution:
             print(row)
@@ -88,26 +81,46 @@ def solve_row_by_row(sudoku, objective):
     for row_index, row in enumerate(sudoku):
         # Modify this prompt to ask for the solution of a single row, providing necessary context.
         response = create_sudoku(row, objective)  # Adjust this call as needed.
-        row_solution = parse_response_to_int_list(response)
+        row_solution = parse_int_list(response).value
         if len(row_solution) != len(row):
             print(f"Error solving row {row_index + 1}: Response does not match row length.")
             return None
         final_solution.append(row_solution)
     return final_solution
 
+def load_puzzle(puzzle_number):
+    """
+    Puzzle puzzle_number from the precomputed bank if one was built, otherwise generated on the spot
+    the way the default bank would hold it, with as many clues removed. Both are seeded and uniquely
+    solvable, so every model is graded against the same single answer.
+    """
+    bank = open_bank(SUDOKU_BANK)
+    if bank:
+        entry = bank[puzzle_number % len(bank)]
+        return entry['puzzle'], entry['solution'], {'difficulty': entry['difficulty'], 'guesses': entry['guesses']}
+    return sudoku_puzzle(puzzle_number)
+
+def play_sudoku(puzzle_number):
+    sudoku, solution, grading = load_puzzle(puzzle_number)
+    if puzzle_number <= THRESHOLD:
+        return None
+    # Silent solver run, so the LLM's attempt can be compared with the effort a backtracker needs
+    solver_stats = new_stats()
+    solve_sudoku_with_explanation([row[:] for row in sudoku], stats=solver_stats)
+    # For puzzle numbers greater than 10, solve row by row.
+    with trace_context(game='sudoku', llm_type='openai', puzzle=puzzle_number):
+        response = create_sudoku_row(sudoku,objective)
+    solved_board = solve_sudoku(sudoku, [n for row_response in response for n in parse_int_list(row_response).value])
+    print(f"\n--- Puzzle {puzzle_number} (Row by Row, {grading['difficulty']}, solver needed {solver_stats['nodes']} nodes and {solver_stats['backtracks']} backtracks) ---\n")
+    for row in solved_board:
+        print(row)
+    check_solution(sudoku)
+    return {'puzzle_number': puzzle_number, 'board': solved_board, 'solver_stats': solver_stats, **grading}
+
 def main():
-    for puzzle_number in range(10, ATTEMPTS + 1):
-        sudoku = generate_sudoku(puzzle_number)
-        if puzzle_number <= THRESHOLD:
-            pass
-        else:
-            # For puzzle numbers greater than 10, solve row by row.
-            print(f"\n--- Puzzle {puzzle_number} (Row by Row) ---\n")
-            response = create_sudoku_row(sudoku,objective)
-            solved_board = solve_sudoku(sudoku, parse_response_to_int_list(response))
-            for row in solved_board:
-                print(row)
-            check_solution(sudoku)
+    # Each puzzle is an independent game, so play them all at once
+    jobs = [('openai', play_sudoku, (puzzle_number,)) for puzzle_number in range(10, ATTEMPTS + 1)]
+    run_games(jobs, CONCURRENCY)
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,5 @@
+import threading
+from functools import lru_cache
 from pysat.formula import CNF
 from pysat.solvers import Glucose3
 from puzzles.sudokugen import generate_sudoku, is_valid_move, find_empty_location
@@ -5,48 +7,79 @@ from puzzles.sudokugen import generate_sudoku, is_valid_move, find_empty_locatio
 def transpose(grid):
     return [list(row) for row in zip(*grid)]
 
-def encode_sudoku(sudoku):
-    cnf = CNF()
+def cell_var(r, c, n):
+    """
+    SAT variable for 'cell (r, c) holds n', with 0-based r and c and n in 1-9.
+    """
+    return 9 * r + 9 * 9 * c + n
+
+@lru_cache(maxsize=1)
+def sudoku_rules():
+    """
+    The constant Sudoku rule clauses, encoded once per process.
+    """
+    clauses = []
 
     # Encode each cell contains at least one number [1-9]
-    for r in range(1, 10):
-        for c in range(1, 10):
-            cnf.append([9 * (r - 1) + 9 * 9 * (c - 1) + n for n in range(1, 10)])
+    for r in range(9):
+        for c in range(9):
+            clauses.append([cell_var(r, c, n) for n in range(1, 10)])
 
     # Rows, columns, and blocks contain no repeated numbers
     for n in range(1, 10):
-        for r in range(1, 10):
-            for c1 in range(1, 10):
-                for c2 in range(c1 + 1, 10):
-                    cnf.append([-1 * (9 * (r - 1) + 9 * 9 * (c1 - 1) + n), -1 * (9 * (r - 1) + 9 * 9 * (c2 - 1) + n)])
-                    
-        for c in range(1, 10):
-            for r1 in range(1, 10):
-                for r2 in range(r1 + 1, 10):
-                    cnf.append([-1 * (9 * (r1 - 1) + 9 * 9 * (c - 1) + n), -1 * (9 * (r2 - 1) + 9 * 9 * (c - 1) + n)])
-                    
+        for r in range(9):
+            for c1 in range(9):
+                for c2 in range(c1 + 1, 9):
+                    clauses.append([-cell_var(r, c1, n), -cell_var(r, c2, n)])
+
+        for c in range(9):
+            for r1 in range(9):
+                for r2 in range(r1 + 1, 9):
+                    clauses.append([-cell_var(r1, c, n), -cell_var(r2, c, n)])
+
         for block in range(9):
-            cells = []
             start_row = 3 * (block // 3)
             start_col = 3 * (block % 3)
-            for r in range(1, 4):
-                for c in range(1, 4):
-                    cells.append((start_row + r, start_col + c))
+            cells = [(start_row + r, start_col + c) for r in range(3) for c in range(3)]
             for i in range(9):
                 for j in range(i + 1, 9):
                     r1, c1 = cells[i]
                     r2, c2 = cells[j]
-                    cnf.append([-1 * (9 * (r1 - 1) + 9 * 9 * (c1 - 1) + n), -1 * (9 * (r2 - 1) + 9 * 9 * (c2 - 1) + n)])
+                    clauses.append([-cell_var(r1, c1, n), -cell_var(r2, c2, n)])
+
+    return tuple(tuple(clause) for clause in clauses)
+
+def givens_as_assumptions(sudoku):
+    """
+    The known values of a puzzle as solver assumptions.
+    """
+    return [cell_var(r, c, sudoku[r][c]) for r in range(9) for c in range(9) if sudoku[r][c]]
+
+def encode_sudoku(sudoku):
+    cnf = CNF(from_clauses=[list(clause) for clause in sudoku_rules()])
 
     # Encode known values from the puzzle
-    for r in range(9):
-        for c in range(9):
-            n = sudoku[r][c]
-            if n:
-                cnf.append([9 * r + 9 * 9 * c + n])
+    cnf.extend([[literal] for literal in givens_as_assumptions(sudoku)])
 
     return cnf
 
+_solver = None
+_solver_lock = threading.Lock()
+
+def solve_with_sat(sudoku):
+    """
+    Solve a puzzle on one long-lived incremental solver that holds the rule clauses, passing the
+    givens as assumptions. Returns the solved grid in row order, or None if there is no solution.
+    """
+    global _solver
+    with _solver_lock:
+        if _solver is None:
+            _solver = Glucose3(bootstrap_with=sudoku_rules())
+        if not _solver.solve(assumptions=givens_as_assumptions(sudoku)):
+            return None
+        model = _solver.get_model()
+    return transpose(decode_solution(model)) # Because the variables are numbered column-major
+
 def decode_solution(model):
     solution = [[0 for _ in range(9)] for _ in range(9)]
     for var in model:
@@ -60,10 +93,19 @@ def decode_solution(model):
             solution[r][c] = n
     return solution
 
-def detailed_reasoning_before_placement(board, row, col, num, depth):
+# Trace events are (row, col, value, action, depth) tuples, with 0-based row and col
+LOOK, TRY, VALID, INVALID_LINE, INVALID_BOX, PLACE, BACKTRACK, SOLVED, FAILED = 'look', 'try', 'valid', 'invalid_line', 'invalid_box', 'place', 'backtrack', 'solved', 'failed'
+
+def new_stats():
+    """
+    Counters filled in by solve_sudoku_with_explanation.
+    """
+    return {'nodes': 0, 'backtracks': 0, 'max_depth': 0}
+
+def detailed_reasoning_before_placement(board, row, col, num, depth, trace=None):
     """
     Simulates reasoning for why a specific number is chosen for a cell before actually placing it.
-    This function mimics a thought process considering Sudoku rules.
+    This function mimics a thought process considering Sudoku rules, recording its verdict on trace.
     """
     valid_move = True  # Assume the move is valid until proven otherwise
 
@@ -73,7 +115,7 @@ def detailed_reasoning_before_placement(board, row, col, num, depth):
     for i in range(9):
         if board[row][i] == num or board[i][col] == num:
             valid_move = False
-            reasons.append(f"{'    ' * (depth + 1)}Invalid: {num} already in row {row+1} or column {col+1}.")
+            reasons.append((row, col, num, INVALID_LINE, depth + 1))
             break
 
     # Subgrid check
@@ -82,51 +124,91 @@ def detailed_reasoning_before_placement(board, row, col, num, depth):
         for j in range(start_col, start_col + 3):
             if board[i][j] == num:
                 valid_move = False
-                reasons.append(f"{'    ' * (depth + 1)}Invalid: {num} already in the 3x3 subgrid.")
+                reasons.append((row, col, num, INVALID_BOX, depth + 1))
                 break
 
-    if valid_move:
-        print(f"{'    ' * (depth + 1)}Valid choice: No conflicts detected for {num}.")
-    else:
-        for reason in reasons:
-            print(reason)
-    
+    if trace is not None:
+        if valid_move:
+            trace.append((row, col, num, VALID, depth + 1))
+        else:
+            trace.extend(reasons)
+
     return valid_move
 
-def solve_sudoku_with_explanation(board, depth=0):
+def solve_sudoku_with_explanation(board, depth=0, trace=None, stats=None):
     '''
-    Backtracking type constraint solution to figure out how to solve a sudoku.Ca
+    Backtracking type constraint solution to figure out how to solve a sudoku.
+
+    Nothing is printed. Pass a list as trace to record every step as a (row, col, value, action, depth)
+    event, and render it with render_trace. Pass new_stats() as stats to count nodes, backtracks and
+    the maximum depth. With neither, this is a plain backtracking solver.
     '''
+    if stats is not None:
+        stats['nodes'] += 1
+        stats['max_depth'] = max(stats['max_depth'], depth)
     empty_cell = find_empty_location(board)
     if not empty_cell:
-        print(f"{'    ' * depth}Puzzle solved successfully.")
+        if trace is not None:
+            trace.append((None, None, None, SOLVED, depth))
         return True  # Puzzle solved
-    
+
     row, col = empty_cell
-    print(f"{'    ' * depth}Looking for a number to place in cell ({row+1}, {col+1}):")
-    
+    if trace is not None:
+        trace.append((row, col, None, LOOK, depth))
+
     for num in range(1, 10):
         if is_valid_move(board, row, col, num):
-            print(f"{'    ' * depth}=> Trying {num} at ({row+1}, {col+1}):")
-            
-            # Explain why this number can be placed here (before actually placing it)
-            if not detailed_reasoning_before_placement(board, row, col, num, depth):
-                continue  # Skip to the next number if the current one doesn't fit logically
-            
+            if trace is not None:
+                trace.append((row, col, num, TRY, depth))
+                # Explain why this number can be placed here (before actually placing it)
+                if not detailed_reasoning_before_placement(board, row, col, num, depth, trace):
+                    continue  # Skip to the next number if the current one doesn't fit logically
+
             board[row][col] = num
-            print(f"{'    ' * (depth + 1)}Placed {num} at ({row+1}, {col+1}).")
-            
-            if solve_sudoku_with_explanation(board, depth + 1):
+            if trace is not None:
+                trace.append((row, col, num, PLACE, depth + 1))
+
+            if solve_sudoku_with_explanation(board, depth + 1, trace, stats):
                 return True
-            
+
             # Backtrack
-            print(f"{'    ' * (depth + 1)}Backtracking: Removing {num} from ({row+1}, {col+1}).")
+            if trace is not None:
+                trace.append((row, col, num, BACKTRACK, depth + 1))
+            if stats is not None:
+                stats['backtracks'] += 1
             board[row][col] = 0
-    
-    if depth == 0:
-        print("No valid number found for any cell, backtracking...")
+
+    if depth == 0 and trace is not None:
+        trace.append((None, None, None, FAILED, depth))
     return False
 
+def render_trace(trace):
+    """
+    Turn trace events back into the indented, human readable explanation.
+    """
+    lines = []
+    for row, col, num, action, depth in trace:
+        indent = '    ' * depth
+        if action == LOOK:
+            lines.append(f"{indent}Looking for a number to place in cell ({row+1}, {col+1}):")
+        elif action == TRY:
+            lines.append(f"{indent}=> Trying {num} at ({row+1}, {col+1}):")
+        elif action == VALID:
+            lines.append(f"{indent}Valid choice: No conflicts detected for {num}.")
+        elif action == INVALID_LINE:
+            lines.append(f"{indent}Invalid: {num} already in row {row+1} or column {col+1}.")
+        elif action == INVALID_BOX:
+            lines.append(f"{indent}Invalid: {num} already in the 3x3 subgrid.")
+        elif action == PLACE:
+            lines.append(f"{indent}Placed {num} at ({row+1}, {col+1}).")
+        elif action == BACKTRACK:
+            lines.append(f"{indent}Backtracking: Removing {num} from ({row+1}, {col+1}).")
+        elif action == SOLVED:
+            lines.append(f"{indent}Puzzle solved successfully.")
+        elif action == FAILED:
+            lines.append("No valid number found for any cell, backtracking...")
+    return "\n".join(lines)
+
 # Generate a Sudoku puzzle with cells randomly removed -- highest poss is 64 currently
 if __name__ == "__main__":
     sudoku = generate_sudoku(45)
@@ -137,7 +219,10 @@ if __name__ == "__main__":
 
     # Backtracking Solver with Explanations (Interactive Mode)
     print("\nStarting to solve with detailed explanations...")
-    solved = solve_sudoku_with_explanation(sudoku)
+    trace, stats = [], new_stats()
+    solved = solve_sudoku_with_explanation(sudoku, trace=trace, stats=stats)
+    print(render_trace(trace))
+    print(f"\nSolver effort: {stats['nodes']} nodes, {stats['backtracks']} backtracks, max depth {stats['max_depth']}")
 
     if solved:
         print("\nSudoku Puzzle Solved Successfully:")
@@ -147,13 +232,8 @@ if __name__ == "__main__":
         print("\nFailed to solve the Sudoku puzzle.")
 
     print("\nSolving with SAT Solver:")
-    cnf = encode_sudoku(sudoku)
-    solver = Glucose3()
-    solver.append_formula(cnf)
-    if solver.solve():
-        model = solver.get_model()
-        solution = decode_solution(model)
-        solution = transpose(solution) # Because somehow I swtiched row and columns around
+    solution = solve_with_sat(sudoku)
+    if solution:
         print("\nSAT Solver Solution")
         for row in solution:
             print(row)
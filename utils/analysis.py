@@ -0,0 +1,223 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_DIR = 'results/store'
+
+WORDLE_COLUMNS = {
+    'Global attempt #': 'run',
+    'Game #': 'attempt',
+    'Run #': 'turn',
+    'LLM type': 'llm_type',
+    'Target word': 'target',
+    'Guessed word': 'guess',
+    "Number of 'G' in colorised results": 'greens',
+    "Number of 'Y' in colorised results": 'yellows',
+}
+
+def wordle_rows(record):
+    """
+    The tidy row of one results_wordle record.
+    """
+    yield {new: record.get(old) for old, new in WORDLE_COLUMNS.items()}
+
+WORDGRID_COLUMNS = ['llm_type', 'objective', 'attempt', 'turn', 'false_count', 'success']
+
+def _attempt_rows(attempt, objective, llm_type=None):
+    llm_type = attempt.get('llm_type', llm_type)
+    success = bool(attempt.get('success'))
+    runs = attempt.get('runs') or [{}]  # An attempt that failed before its first turn still counts
+    for run in runs:
+        false_count = run.get('false_count')
+        yield (llm_type, objective, attempt.get('attempt_number'), run.get('index'),
+               false_count if isinstance(false_count, int) else None, success)
+
+def wordgrid_rows(record):
+    """
+    The tidy rows, as WORDGRID_COLUMNS tuples, of a streamed attempt or of a whole results_wg.json.
+    Both layouts of the JSON file are read: the current {llm_type: {matrix_<objective>: [attempts]}}
+    and the older {matrix_<objective>: [attempts]}.
+    """
+    if 'runs' in record:
+        yield from _attempt_rows(record, record.get('objective_key'))
+        return
+    for key, value in record.items():
+        if isinstance(value, list):
+            for attempt in value:
+                yield from _attempt_rows(attempt, key.replace('matrix_', '', 1))
+        elif isinstance(value, dict):
+            for matrix, attempts in value.items():
+                for attempt in attempts:
+                    yield from _attempt_rows(attempt, matrix.replace('matrix_', '', 1), key)
+
+def wordgrid_dicts(record):
+    return (dict(zip(WORDGRID_COLUMNS, row)) for row in wordgrid_rows(record))
+
+class ResultStore:
+    """
+    A columnar copy of a results file, kept as Parquet parts under STORE_DIR/name.
+
+    ingest() only reads what was added to a JSONL results stream since the last call and writes it
+    as a new part, so re-running an analysis costs as much as the games added since. A stream that
+    was truncated by a fresh sweep starts a new generation, so its games are kept apart from the
+    previous sweep's, and load() only returns the latest one. A plain JSON results file can't be
+    read incrementally and is re-read whenever it changes. Switching to ingest another file drops
+    the parts of the previous one.
+
+    Args:
+        flatten: Turns one record into an iterable of row dicts.
+    """
+    def __init__(self, name, flatten, directory=STORE_DIR):
+        self.directory = os.path.join(directory, name)
+        self.flatten = flatten
+        self.state_path = os.path.join(self.directory, '_state.json')
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = {'rows': 0, 'sources': {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as file:
+                self.state = json.load(file)
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(tmp_path, self.state_path)
+
+    def _write_part(self, tag, generation, records):
+        rows = [row for record in records for row in self.flatten(record)]
+        if not rows:
+            return 0
+        table = pa.Table.from_pylist(rows)
+        first = self.state['rows']
+        table = table.append_column('generation', pa.array([generation] * len(rows), pa.int32()))
+        table = table.append_column('seq', pa.array(range(first, first + len(rows)), pa.int64()))
+        pq.write_table(table, os.path.join(self.directory, f'{tag}-{generation:04d}-{first:012d}.parquet'))
+        self.state['rows'] += len(rows)
+        return len(rows)
+
+    def _drop_parts(self, tag):
+        for name in os.listdir(self.directory):
+            if name.startswith(tag + '-'):
+                os.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _tag(path):
+        return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+
+    def ingest(self, path):
+        """
+        Add whatever path holds that the store hasn't seen yet. Returns the number of new rows.
+        """
+        if not os.path.exists(path):
+            return 0
+        tag = self._tag(path)
+        for other in [other for other in self.state['sources'] if other != path]:
+            # The results moved to another file, e.g. from results_*.json to a new .jsonl stream
+            self._drop_parts(self._tag(other))
+            del self.state['sources'][other]
+        self.state['current'] = path
+        source = self.state['sources'].setdefault(path, {'generation': 0, 'offset': 0, 'fingerprint': None})
+        with open(path, 'rb') as file:
+            if not path.endswith('.jsonl'):
+                content = file.read()
+                digest = hashlib.sha1(content).hexdigest()
+                if digest == source['fingerprint']:
+                    return 0
+                self._drop_parts(tag)
+                source['fingerprint'] = digest
+                records = json.loads(content)
+                added = self._write_part(tag, 0, records if isinstance(records, list) else [records])
+                self._save_state()
+                return added
+
+            fingerprint = hashlib.sha1(file.readline()).hexdigest()
+            if fingerprint != source['fingerprint'] or os.path.getsize(path) < source['offset']:
+                # A new sweep rewrote the stream from the start
+                if source['fingerprint'] is not None:
+                    source['generation'] += 1
+                source['fingerprint'], source['offset'] = fingerprint, 0
+            file.seek(source['offset'])
+            data = file.read()
+        # Leave a line still being written for the next ingest
+        complete = data[:data.rfind(b'\n') + 1]
+        records = []
+        for line in complete.splitlines():
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Skipping a partial record in {path}")
+        added = self._write_part(tag, source['generation'], records)
+        source['offset'] += len(complete)
+        self._save_state()
+        return added
+
+    def load(self, columns=None, all_generations=False):
+        """
+        The rows of the latest sweep of the file last ingested as one DataFrame, in ingestion order.
+        Pass all_generations=True to also get the rows of its earlier sweeps, told apart by their
+        generation column.
+        """
+        parts = sorted(name for name in os.listdir(self.directory) if name.endswith('.parquet'))
+        current = self.state.get('current')
+        if current is not None:
+            tag, generation = self._tag(current), self.state['sources'][current]['generation']
+            parts = [name for name in parts if name.startswith(tag + '-') and (all_generations or name.startswith(f'{tag}-{generation:04d}-'))]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        frames = [pq.read_table(os.path.join(self.directory, name), columns=columns).to_pandas() for name in parts]
+        frame = pd.concat(frames, ignore_index=True)
+        return frame.sort_values('seq', ignore_index=True) if 'seq' in frame else frame
+
+def wordle_games(df):
+    """
+    Number the games of a wordle table by generation, run, LLM and attempt. Turns recorded before
+    games were numbered have no attempt; for those a game is a run of turns of one run, LLM and
+    target, and a new one starts whenever those change or the turn number stops increasing.
+    """
+    key = df[['generation', 'run', 'llm_type', 'target']]
+    new_game = (key != key.shift()).any(axis=1) | (df['turn'] <= df['turn'].shift())
+    games = new_game.cumsum()
+    if 'attempt' not in df:
+        return games
+    numbered = df['attempt'].notna()
+    if numbered.any():
+        ids = df[numbered].groupby(['generation', 'run', 'llm_type', 'attempt'], sort=False).ngroup()
+        games[numbered] = ids + games.max() + 1
+    return games
+
+def wordle_metrics(df):
+    """
+    Success rate per LLM, mean G/Y per turn and G/Y summary statistics, as group-bys over the table.
+    """
+    df = df.assign(game=wordle_games(df), solved=df['greens'] == 5)
+    games = df.groupby('game').agg(llm_type=('llm_type', 'first'), solved=('solved', 'any'), turns=('turn', 'max'))
+    return {
+        'games': games,
+        'successes': int(games['solved'].sum()),
+        'success_rate': games.groupby('llm_type')['solved'].mean(),
+        'turn_trends': df.groupby(['llm_type', 'turn'])[['greens', 'yellows']].mean(),
+        'run_trends': df.groupby('run')[['greens', 'yellows']].mean(),
+        'g_y_summary': df[['greens', 'yellows']].describe(),
+    }
+
+def wordgrid_metrics(df):
+    """
+    Success rate, average false count and the false count distribution per (llm_type, objective),
+    as group-bys over the tidy table. A replayed attempt only counts once, with its latest result.
+    """
+    keys = [column for column in ('generation', 'llm_type', 'objective', 'attempt', 'turn') if column in df]
+    df = df.drop_duplicates(subset=keys, keep='last')
+    group = ['llm_type', 'objective']
+    attempts = df.groupby(group + [column for column in ('generation', 'attempt') if column in df], dropna=False)['success'].any()
+    false_counts = df.dropna(subset=['false_count'])
+    return {
+        'success_rate': attempts.groupby(level=group).mean(),
+        'attempts': attempts.groupby(level=group).size(),
+        'avg_false_count': false_counts.groupby(group)['false_count'].mean(),
+        'false_count_distribution': false_counts.groupby(group)['false_count'].value_counts().sort_index(),
+        'turns_to_success': df[df['false_count'] == 0].groupby(attempts.index.names, dropna=False)['turn'].min().groupby(level=group).mean(),
+    }
@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+import matplotlib
+matplotlib.use('Agg')  # Headless: charts are only ever written to files
+import matplotlib.pyplot as plt
+import pandas as pd
+
+CHART_DIR = 'charts'
+CACHE_FILE = '.chart_cache.json'
+
+_charts = {}
+
+def chart(name, filename=None):
+    """
+    Register a function that draws a chart from a DataFrame and returns its figure. It is only
+    called when the chart is requested and its input has changed since it was last rendered.
+    """
+    def register(func):
+        _charts[name] = (func, filename or f'{name}.png')
+        return func
+    return register
+
+def available():
+    return sorted(_charts)
+
+def data_digest(df, func=None):
+    """
+    A hash of a chart's input data, and of the code drawing it, so editing a chart re-renders it.
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    if func is not None:
+        digest.update(func.__code__.co_code)
+        digest.update(repr(func.__code__.co_consts).encode('utf-8'))
+    return digest.hexdigest()
+
+def _load_cache(directory):
+    path = os.path.join(directory, CACHE_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            return json.load(file)
+    return {}
+
+def _save_cache(directory, cache):
+    path = os.path.join(directory, CACHE_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(cache, file, indent=4)
+    os.replace(path + '.tmp', path)
+
+def render(df, names=None, directory=CHART_DIR, force=False, dpi=100):
+    """
+    Render the requested charts (all registered ones if names is None) from df into directory.
+    A chart whose file exists and whose input hash is unchanged is skipped unless force is set.
+
+    Returns:
+        The paths of the charts drawn this time.
+    """
+    names = available() if names is None else names
+    unknown = [name for name in names if name not in _charts]
+    if unknown:
+        raise KeyError(f"Unknown charts {unknown}, choose from {available()}")
+    os.makedirs(directory, exist_ok=True)
+    cache = _load_cache(directory)
+    drawn = []
+    for name in names:
+        func, filename = _charts[name]
+        path = os.path.join(directory, filename)
+        digest = data_digest(df, func)
+        if not force and cache.get(name) == digest and os.path.exists(path):
+            continue
+        fig = func(df)
+        try:
+            fig.savefig(path, dpi=dpi)
+        finally:
+            plt.close(fig)
+        cache[name] = digest
+        drawn.append(path)
+    _save_cache(directory, cache)
+    return drawn
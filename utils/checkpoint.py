@@ -0,0 +1,70 @@
+import os
+import json
+import threading
+
+class Checkpoint:
+    """
+    Tracks which games of a sweep have finished and the turn state of games still in progress,
+    so a restarted sweep can skip finished work and pick partial games up where they stopped.
+
+    Games are identified by a tuple key, e.g. (llm_type, objective_key, attempt). The file is
+    rewritten atomically after every change, so it is always readable after a crash.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.finished = set()
+        self.in_progress = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                saved = json.load(file)
+            self.finished = set(saved.get('finished', []))
+            self.in_progress = saved.get('in_progress', {})
+
+    @staticmethod
+    def _id(key):
+        return '|'.join(str(part) for part in key)
+
+    def is_finished(self, key):
+        return self._id(key) in self.finished
+
+    def state_of(self, key):
+        """
+        The last saved turn state of a game, or None if it never started.
+        """
+        return self.in_progress.get(self._id(key))
+
+    def save_state(self, key, state):
+        """
+        Save a snapshot of a game's turn state. The game keeps mutating its own lists, so they are
+        copied here, in the game's thread, rather than serialized later while another game writes.
+        """
+        snapshot = json.loads(json.dumps(state))
+        with self.lock:
+            self.in_progress[self._id(key)] = snapshot
+            self._write()
+
+    def mark_finished(self, key):
+        with self.lock:
+            self.finished.add(self._id(key))
+            self.in_progress.pop(self._id(key), None)
+            self._write()
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'finished': sorted(self.finished), 'in_progress': self.in_progress}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """
+        Delete the checkpoint once the whole sweep has finished.
+        """
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.finished.clear()
+            self.in_progress.clear()
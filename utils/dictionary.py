@@ -0,0 +1,86 @@
+import os
+import threading
+import enchant
+
+LANGUAGE = "en_US"  # or "en_GB" for British English
+# Word lists used to precompute the valid words. Anything not listed still gets checked, once, by enchant.
+# The wordgrid search only knows the listed words, and puzzles/wordle.txt only has 5-letter ones, so 3x3
+# and 4x4 grids need an OS word list (e.g. the wamerican package) or WORDLIST_PATH.
+WORDLIST_PATHS = [path for path in (os.getenv('WORDLIST_PATH'), '/usr/share/dict/words', 'puzzles/wordle.txt') if path]
+
+class Dictionary:
+    """
+    Word validity backed by a single enchant dictionary per process.
+
+    Words from the word lists are checked by enchant once at load time and kept in frozensets grouped
+    by length, so checking them is an O(1) set lookup. Any other word is checked by enchant the first
+    time it is seen and memoised, so the answers always match enchant's.
+    """
+    def __init__(self, language=LANGUAGE, wordlist_paths=WORDLIST_PATHS):
+        self.checker = enchant.Dict(language)
+        self.lock = threading.Lock()  # enchant dictionaries are not safe to share between threads
+        self.memo = {}
+        by_length = {}
+        for word in self._read_wordlists(wordlist_paths):
+            if self.checker.check(word):
+                by_length.setdefault(len(word), set()).add(word)
+        self.by_length = {length: frozenset(words) for length, words in by_length.items()}
+
+    @staticmethod
+    def _read_wordlists(paths):
+        words = set()
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', errors='ignore') as file:
+                for line in file:
+                    word = line.strip()
+                    if word.isalpha():
+                        words.update((word, word.lower()))
+        return words
+
+    def words_of_length(self, length):
+        """
+        The precomputed valid words of one length.
+        """
+        return self.by_length.get(length, frozenset())
+
+    def check(self, word):
+        if not word:
+            return False
+        if word in self.words_of_length(len(word)):
+            return True
+        valid = self.memo.get(word)
+        if valid is None:
+            with self.lock:
+                valid = self.checker.check(word)
+            self.memo[word] = valid
+        return valid
+
+    def validate_many(self, words):
+        """
+        Check many words at once. Returns a dict of word -> validity.
+        """
+        return {word: self.check(word) for word in words}
+
+_dictionaries = {}
+_lock = threading.Lock()
+
+def get_dictionary(language=LANGUAGE):
+    """
+    The shared dictionary for a language, built once on first use even when many games ask at once.
+    """
+    dictionary = _dictionaries.get(language)
+    if dictionary is None:
+        with _lock:
+            dictionary = _dictionaries.get(language)
+            if dictionary is None:
+                dictionary = Dictionary(language)
+                _dictionaries[language] = dictionary
+    return dictionary
+
+def is_valid_word(word, language=LANGUAGE):
+    return get_dictionary(language).check(word)
+
+def validate_many(words, language=LANGUAGE):
+    return get_dictionary(language).validate_many(words)
@@ -0,0 +1,226 @@
+import re
+import json
+
+CODE_FENCE = re.compile(r"(?:```|''')[a-zA-Z]*\s*(.*?)\s*(?:```|''')", re.DOTALL)
+TRAILING_COMMA = re.compile(r',(?=\s*[\]}])')
+JSON_START = re.compile(r'[\[{]')
+LABEL = re.compile(r'\b(?:row|column|col|box|line|step|attempt)\s*#?\s*\d+\s*[:.)\-]?', re.IGNORECASE)
+WORD = re.compile(r'[A-Za-z]+')
+DIGITS = re.compile(r'\d+')
+QUOTES = '"\'`*.'
+WORD_KEYS = ('word', 'guess', 'answer')
+QUOTED_WORD = re.compile(r'["\'`*]+([A-Za-z]+)["\'`*]+')
+MARKED_WORD = re.compile(r'\b(?:answer|guess|word)\b\W*(?:is|:|=)?\W*([A-Za-z]+)', re.IGNORECASE)
+
+_decoder = json.JSONDecoder()
+
+class ParseResult:
+    """
+    A parsed value, or the reason it could not be parsed. Truthy when parsing succeeded, so callers can
+    write `if result:` and log result.error otherwise.
+    """
+    __slots__ = ('value', 'error')
+
+    def __init__(self, value, error=None):
+        self.value = value
+        self.error = error
+
+    def __bool__(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f"ParseResult({self.value!r}, error={self.error!r})"
+
+def _load_json(text):
+    """
+    The first JSON object or array in text, tolerating prose around it, trailing commas and single
+    quotes. Returns None if there is none.
+    """
+    for match in JSON_START.finditer(text):
+        candidate = text[match.start():]
+        for attempt in (candidate, TRAILING_COMMA.sub('', candidate), TRAILING_COMMA.sub('', candidate).replace("'", '"')):
+            try:
+                return _decoder.raw_decode(attempt)[0]
+            except ValueError:
+                continue
+    return None
+
+def extract_payload(response):
+    """
+    One pass over a model response: dicts and lists are returned as they are, strings are unwrapped
+    from code fences and decoded as JSON if they contain any, otherwise the bare text is returned.
+    """
+    if isinstance(response, (dict, list)) or response is None:
+        return response
+    text = str(response).strip()
+    fenced = CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    payload = _load_json(text)
+    return text if payload is None else payload
+
+def _first_value(payload, kind):
+    """
+    The first value of a type in a JSON payload, looking inside dicts.
+    """
+    if isinstance(payload, kind):
+        return payload
+    if isinstance(payload, dict):
+        for value in payload.values():
+            if isinstance(value, kind):
+                return value
+    return None
+
+def _clean(word):
+    return str(word).strip().strip(QUOTES).strip()
+
+def _split_words(text):
+    """
+    A list of single words from plain text: the last line of comma-separated words, or else the
+    lines that each hold a single word.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for line in reversed(lines):
+        items = [_clean(item) for item in line.split(',') if _clean(item)]
+        if len(items) > 1 and all(WORD.fullmatch(item) for item in items):
+            return items
+    items = [_clean(line) for line in lines]
+    items = [item for item in items if WORD.fullmatch(item)]
+    return items or None
+
+def parse_word(response, length=5):
+    """
+    A single lower-case word of length letters from a response. In a JSON object the word, guess or
+    answer field is read first. In prose, a quoted or answer-marked word is preferred, then one
+    written in capitals, then the last word of the right length, as models reason before answering.
+    """
+    payload = extract_payload(response)
+    if not payload:
+        return ParseResult('', 'empty response')
+    value = next((payload[key] for key in WORD_KEYS if isinstance(payload, dict) and isinstance(payload.get(key), str)), None)
+    if value is None:
+        value = _first_value(payload, str)
+    if value is None:
+        values = _first_value(payload, list)
+        value = str(values[0]) if values else None
+    if value is None:
+        return ParseResult('', 'no string value in the JSON response')
+    value = _clean(value)
+    if WORD.fullmatch(value):
+        word = value
+    else:
+        # Prose around the answer
+        fits = lambda words: [word for word in words if len(word) == length]
+        marked = fits(match.group(1) for match in sorted([*QUOTED_WORD.finditer(value), *MARKED_WORD.finditer(value)], key=lambda match: match.start(1)))
+        words = fits(WORD.findall(value))
+        capitals = [word for word in words if word.isupper()]
+        word = (marked or capitals or words or [''])[-1]
+    if not word:
+        return ParseResult('', f'no {length}-letter word found')
+    if len(word) != length:
+        return ParseResult(word.lower(), f'expected {length} letters, got {len(word)}')
+    return ParseResult(word.lower())
+
+def parse_word_list(response, count=None):
+    """
+    A list of words from a response: a JSON list (flattened if nested), a JSON string of
+    comma-separated words, or plain comma- or line-separated text.
+    """
+    payload = extract_payload(response)
+    if not payload:
+        return ParseResult([], 'empty response')
+    words = _first_value(payload, list)
+    if words is None:
+        value = _first_value(payload, str)
+        words = _split_words(value) if value else None
+    if words is None:
+        return ParseResult([], 'no word list found')
+    if any(isinstance(word, list) for word in words):
+        words = [word for item in words for word in (item if isinstance(item, list) else [item])]
+    words = [_clean(word) for word in words if _clean(word)]
+    if not words:
+        return ParseResult([], 'no word list found')
+    if count is not None and len(words) != count:
+        return ParseResult(words, f'expected {count} words, got {len(words)}')
+    return ParseResult(words)
+
+def _digit_runs(payload):
+    """
+    The runs of digits in a payload, reading only the values of dicts.
+    """
+    if isinstance(payload, dict):
+        return [run for value in payload.values() for run in _digit_runs(value)]
+    if isinstance(payload, list):
+        return [run for value in payload for run in _digit_runs(value)]
+    return DIGITS.findall(LABEL.sub(' ', str(payload)))
+
+def parse_int_list(response):
+    """
+    Every digit in a response, in order, ignoring labels such as 'Row 3:'. Runs of digits are split
+    into single digits, so '534678912' reads as nine numbers.
+    """
+    payload = extract_payload(response)
+    if not payload:
+        return ParseResult([], 'empty response')
+    numbers = [int(digit) for run in _digit_runs(payload) for digit in run]
+    if not numbers:
+        return ParseResult([], 'no numbers found')
+    return ParseResult(numbers)
+
+def parse_int_grid(response, size=9):
+    """
+    A size x size grid of digits from a response, as a list of rows.
+    """
+    numbers = parse_int_list(response)
+    if not numbers:
+        return ParseResult([], numbers.error)
+    values = numbers.value
+    if len(values) != size * size:
+        return ParseResult([values[r * size:(r + 1) * size] for r in range(len(values) // size)], f'expected {size * size} numbers, got {len(values)}')
+    return ParseResult([values[r * size:(r + 1) * size] for r in range(size)])
+
+JSON_WORD = re.compile(r'"word"\s*:\s*"\s*([A-Za-z]+)\s*"')
+JSON_WORD_LIST = re.compile(r'"words"\s*:\s*(\[[^\]]*\])')
+WORD_LINE = re.compile(r'^[\s"\'`*]*([A-Za-z]+)[\s"\'`*.]*\n', re.MULTILINE)
+WORD_LIST_LINE = re.compile(r'^[\s"\'`*]*([A-Za-z]+(?:\s*,\s*[A-Za-z]+)+)[\s"\'`*.]*\n', re.MULTILINE)
+
+def complete_answer(text, kind, size=None, json_only=False):
+    """
+    The answer in a partly streamed response, as soon as it is complete, or None while more text is
+    needed. A closed JSON field always counts. Without json_only, a whole line holding just a word of
+    size letters, or a comma-separated list of exactly size words, counts too; that guess can be
+    fooled by a preamble line, so it needs a size and is only meant for prompts without a schema.
+
+    Args:
+        kind: 'word' or 'word_list'.
+        size: Letters in the word, or words in the list.
+        json_only: Only stop on the closed JSON field, for responses that follow a schema.
+
+    Returns:
+        The answer as a small JSON document, ready for parse_word or parse_word_list.
+    """
+    if kind == 'word':
+        match = JSON_WORD.search(text)
+        if match and (size is None or len(match.group(1)) == size):
+            return json.dumps({'word': match.group(1)})
+        if json_only or size is None:
+            return None
+        for match in WORD_LINE.finditer(text):
+            if len(match.group(1)) == size:
+                return json.dumps({'word': match.group(1)})
+    elif kind == 'word_list':
+        match = JSON_WORD_LIST.search(text)
+        if match:
+            try:
+                words = json.loads(match.group(1))
+            except ValueError:
+                words = None
+            if words and (size is None or len(words) == size):
+                return json.dumps({'words': words})
+        if json_only or size is None:
+            return None
+        for match in WORD_LIST_LINE.finditer(text):
+            words = [word.strip() for word in match.group(1).split(',')]
+            if len(words) == size:
+                return json.dumps({'words': words})
+    return None
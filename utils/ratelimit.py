@@ -0,0 +1,125 @@
+import time
+import inspect
+import threading
+from functools import wraps
+from utils.retry import status_code_of, retry_after_of
+
+# Requests and tokens per minute, per provider or per "provider:model". The more specific entry wins.
+RATE_LIMITS = {
+    'openai': {'rpm': 500, 'tpm': 200000},
+    'anthropic': {'rpm': 50, 'tpm': 40000},
+    'groq': {'rpm': 30, 'tpm': 6000},
+    'gemini': {'rpm': 60, 'tpm': 1000000},
+    'ollama': {'rpm': 0, 'tpm': 0},  # Local, so unlimited
+}
+COMPLETION_TOKENS = 512  # Tokens we expect back, counted against tpm before the call is made
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously up to its capacity.
+    """
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Block until amount tokens are available, then take them. Requests larger than the bucket
+        just wait for a full bucket.
+        """
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = max(self.paused_until - now, (amount - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hold every caller back, e.g. when the provider answers 429 with a Retry-After.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    """
+    Shared request and token buckets, one pair per (provider, model).
+    """
+    def __init__(self, limits=RATE_LIMITS):
+        self.limits = dict(limits)
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def configure(self, limits):
+        with self.lock:
+            self.limits.update(limits)
+            self.buckets.clear()
+
+    def _buckets(self, provider, model):
+        key = (provider, model)
+        with self.lock:
+            if key not in self.buckets:
+                limit = self.limits.get(f"{provider}:{model}", self.limits.get(provider, {}))
+                self.buckets[key] = (TokenBucket(limit.get('rpm', 0)), TokenBucket(limit.get('tpm', 0)))
+            return self.buckets[key]
+
+    def acquire(self, provider, model, tokens):
+        requests_bucket, tokens_bucket = self._buckets(provider, model)
+        requests_bucket.acquire(1)
+        tokens_bucket.acquire(tokens)
+
+    def pause(self, provider, model, seconds):
+        for bucket in self._buckets(provider, model):
+            bucket.pause(seconds)
+
+rate_limiter = RateLimiter()
+
+def configure_limits(limits):
+    """
+    Override the default limits, e.g. with the RATE_LIMITS block in info.json.
+    """
+    rate_limiter.configure(limits or {})
+
+def estimate_tokens(*texts):
+    """
+    Roughly four characters per token, which is close enough for budgeting.
+    """
+    return sum(len(str(text)) for text in texts if text) // 4 + COMPLETION_TOKENS
+
+def rate_limited(provider, model_arg, prompt_arg, system_arg=None):
+    """
+    Wait for room in the provider's request and token buckets before every call, and pause the
+    buckets for everyone when the provider answers 429.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            model = bound.arguments.get(model_arg)
+            rate_limiter.acquire(provider, model, estimate_tokens(bound.arguments.get(prompt_arg), bound.arguments.get(system_arg)))
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if status_code_of(e) == 429:
+                    rate_limiter.pause(provider, model, retry_after_of(e) or 1)
+                raise
+
+        return wrapper
+    return decorator
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import threading
+
+class ResultsWriter:
+    """
+    Append-only JSONL sink for game results, safe to share between concurrent games.
+
+    Every record is flushed as soon as it is written and fsynced every fsync_every records or
+    fsync_interval seconds, so a crash loses at most the last few games.
+    """
+    def __init__(self, path, append=True, fsync_every=20, fsync_interval=5.0):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.file = open(path, 'a' if append else 'w')
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def write(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        """
+        Write records as one block, so the records of one game are never interleaved with another's.
+        """
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        if not lines:
+            return
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+            self.pending += len(records)
+            if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                self._sync()
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_records(path):
+    """
+    Yield every record in a JSONL results file, skipping a line torn by a crash mid-write.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping a partial record in {path}")
+
+def _write_json(data, json_path):
+    """
+    Write through a temporary file so the compacted file is never half-written.
+    """
+    os.makedirs(os.path.dirname(json_path) or '.', exist_ok=True)
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(tmp_path, json_path)
+
+def compact_wordle(jsonl_path, json_path='results/results_wordle.json'):
+    """
+    Rebuild the flat list layout of results_wordle.json from the streamed records, ordered by run,
+    LLM and game.
+    """
+    games = {}
+    for record in read_records(jsonl_path):
+        key = (record['LLM type'], record['Global attempt #'], record.get('Game #'))
+        turns = games.setdefault(key, [])
+        # A game replayed after a crash is written twice, the later copy wins. Records written
+        # before games were numbered can't be told apart and are all kept.
+        if key[2] is not None and turns and record['Run #'] <= turns[-1]['Run #']:
+            turns.clear()
+        turns.append(record)
+    order = sorted(games, key=lambda key: (key[1], key[0], -1 if key[2] is None else key[2]))
+    results = [record for key in order for record in games[key]]
+    _write_json(results, json_path)
+    return results
+
+def compact_wordgrid(jsonl_path, json_path='results/results_wg.json'):
+    """
+    Rebuild the {llm_type: {matrix_<objective_key>: [attempts]}} layout of results_wg.json from the
+    streamed records, with attempts in order.
+    """
+    latest = {}
+    for record in read_records(jsonl_path):
+        # A game replayed after a crash is written twice, the later record wins
+        latest[(record['llm_type'], record['objective_key'], record['attempt_number'])] = record
+
+    combined_results = {}
+    for (llm_type, objective_key, attempt_number) in sorted(latest, key=lambda key: key[2]):
+        record = dict(latest[(llm_type, objective_key, attempt_number)])
+        record.pop('objective_key')
+        combined_results.setdefault(llm_type, {}).setdefault(f'matrix_{objective_key}', []).append(record)
+    _write_json(combined_results, json_path)
+    return combined_results
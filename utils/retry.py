@@ -1,7 +1,60 @@
 import time
+import random
+from email.utils import parsedate_to_datetime
 from functools import wraps
 
-def retry_except(exceptions_to_catch=(Exception,), tries=4, delay=1):
+TRANSIENT_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504, 529)
+TRANSIENT_ERROR_NAMES = ('RateLimitError', 'APIConnectionError', 'APITimeoutError', 'InternalServerError', 'ServiceUnavailable', 'ResourceExhausted', 'ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout')
+retry_listeners = []  # Called as listener(exception, attempt) before every retry, e.g. by llms.tracing
+
+def status_code_of(exception):
+    """
+    Find the HTTP status code on a provider or requests exception, if there is one.
+    """
+    status = getattr(exception, 'status_code', None) or getattr(exception, 'code', None)
+    if status is None and getattr(exception, 'response', None) is not None:
+        status = getattr(exception.response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def is_transient(exception):
+    """
+    Rate limits, timeouts, dropped connections and 5xx errors are worth retrying, anything else is not.
+    """
+    if status_code_of(exception) in TRANSIENT_STATUS_CODES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exception).__mro__)
+
+def retry_after_of(exception):
+    """
+    Seconds the provider asked us to wait in its Retry-After header, or None.
+    """
+    headers = getattr(getattr(exception, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def backoff_delay(attempt, delay, max_delay):
+    """
+    Exponential backoff with full jitter: a random wait between 0 and delay * 2**(attempt - 1), capped.
+    """
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+def retry_except(exceptions_to_catch=(Exception,), tries=4, delay=1, max_delay=60, transient=False):
     """
     Retry decorator with customizable parameters.
 
@@ -9,7 +62,10 @@ def retry_except(exceptions_to_catch=(Exception,), tries=4, delay=1):
         exceptions_to_catch: A tuple of exceptions to catch and retry on.
                              Defaults to catching all Exceptions.
         tries: The maximum number of attempts.
-        delay: The delay in seconds between retries.
+        delay: The base delay in seconds, doubled after every failed attempt and jittered.
+        max_delay: The longest we ever wait between two attempts.
+        transient: Also retry provider rate limits, timeouts and 5xx errors, waiting at least as
+                   long as their Retry-After header asks.
     """
 
     def decorator(func):
@@ -18,11 +74,19 @@ def retry_except(exceptions_to_catch=(Exception,), tries=4, delay=1):
             for attempt in range(1, tries + 1):
                 try:
                     return func(*args, **kwargs)
-                except exceptions_to_catch as e:
-                    print(f"Exception caught: {e}. Retrying in {delay} seconds (attempt {attempt}/{tries})")
-                    time.sleep(delay)
-            else:  # No exception in the final attempt
-                return func(*args, **kwargs) 
+                except Exception as e:
+                    if not isinstance(e, exceptions_to_catch) and not (transient and is_transient(e)):
+                        raise
+                    if attempt == tries:
+                        raise
+                    wait = backoff_delay(attempt, delay, max_delay)
+                    retry_after = retry_after_of(e)
+                    if retry_after is not None:
+                        wait = max(wait, min(retry_after, max_delay))
+                    print(f"Exception caught: {e}. Retrying in {wait:.1f} seconds (attempt {attempt}/{tries})")
+                    for listener in retry_listeners:
+                        listener(e, attempt)
+                    time.sleep(wait)
 
         return wrapper
     return decorator
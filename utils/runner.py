@@ -0,0 +1,44 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = 4
+
+async def _run_jobs(jobs, limits):
+    """
+    Run every job on a worker thread, holding the semaphore of its provider while it plays.
+    """
+    loop = asyncio.get_running_loop()
+    sizes = {provider: max(1, limits.get(provider, DEFAULT_CONCURRENCY)) for provider, _, _ in jobs}
+    semaphores = {provider: asyncio.Semaphore(size) for provider, size in sizes.items()}
+
+    async def run(provider, func, args):
+        async with semaphores[provider]:
+            return await loop.run_in_executor(executor, func, *args)
+
+    with ThreadPoolExecutor(max_workers=sum(sizes.values())) as executor:
+        return await asyncio.gather(*(run(provider, func, args) for provider, func, args in jobs), return_exceptions=True)
+
+def run_games(jobs, limits=None):
+    """
+    Play many independent games at once.
+
+    Args:
+        jobs: A list of (provider, func, args) tuples. Each func plays one whole game, so the
+              turn-to-turn dependency inside a game is untouched.
+        limits: A dict of provider -> maximum number of games in flight for that provider.
+                Providers that are missing fall back to DEFAULT_CONCURRENCY.
+
+    Returns:
+        The return value of each job, in the same order as jobs. A job that raised is reported
+        and returned as None.
+    """
+    if not jobs:
+        return []
+    outcomes = asyncio.run(_run_jobs(jobs, limits or {}))
+    results = []
+    for (provider, func, args), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Game {func.__name__}{args} using {provider} failed: {outcome}")
+            outcome = None
+        results.append(outcome)
+    return results
@@ -1,12 +1,19 @@
 # %%
 import os
-import re
+import sys
 import json
-import enchant
 from dotenv import load_dotenv
 load_dotenv()
-from llms.llms import llm_call_gpt_json, llm_call_claude_json, llm_call_groq, llm_call_gemini_json
-from utils.retry import retry_except
+from llms.llms import llm_call_structured
+from llms.tracing import trace_context
+from llms.batch import run_batch
+from utils.dictionary import is_valid_word
+from utils.parsing import parse_word_list
+from puzzles.gridvalidator import validate_grid, can_complete, complete_grid
+from utils.runner import run_games
+from utils.results import ResultsWriter, compact_wordgrid
+from utils.checkpoint import Checkpoint
+from utils.ratelimit import configure_limits
 
 with open('info.json', 'r') as file:
     data = json.load(file)
@@ -19,124 +26,62 @@ GPT = data.get('GPT_MODEL')
 CLAUDE = data.get('CLAUDE')
 OLLAMA = data.get('OLLAMA')
 GEMINI = data.get('GEMINI')
+CONCURRENCY = data.get('CONCURRENCY', {})
+STREAM = data.get('STREAM', False)  # Stream answers and stop reading once they are complete
+COMPLETION_NODES = 200000  # Search budget of the per-turn completability check
+RESULTS_STREAM = 'results/results_wg.jsonl'
+CHECKPOINT = 'results/checkpoint_wg.json'
+configure_limits(data.get('RATE_LIMITS'))
 
-def get_llm_response(input_str, llm_type='openai'):
-    if llm_type == 'openai':
-        return llm_call_gpt_json(input_str, GPT)
-    elif llm_type == 'claude':
-        return llm_call_claude_json(input_str, CLAUDE)
-    elif llm_type == 'groq':
-        return llm_call_groq(input_str)
-    elif llm_type == 'gemini':
-        return llm_call_gemini_json(input_str)    
-    
-def create_word_matrix(objective, llm_type):
-    """Generate a matrix of words, starting with 'C' and ending with 'N'."""
-    response = get_llm_response(f""" {instructions}. Objective is: {objective}. The words have to be valid English words when read across the rows and also when read down the columns. This is very important, think quietly first. Reply with only the list of words, as follows. Ensure you reply with the correct number of words and in the correct order. For example:
-    '''
-    Word, Word, Word etc
-    '''
-    """, llm_type)
-    return response
+def objective_size(objective_key):
+    """The grid size of an objective, e.g. 3 for 'objective_3'."""
+    return int(objective_key.rsplit('_', 1)[1])
 
-def check_word_validity(word):
+def get_llm_response(input_str, llm_type='openai', size=None):
     """
-    Check if a word is a valid English word using pyenchant.
+    The word list answered by llm_type, using the provider's structured output. With a size,
+    a list of any other length is asked again, and a streamed answer is only complete once it
+    holds size words. After a failed re-ask the last parsed list is still returned, possibly
+    of the wrong length, so the turn is graded as invalid; it is empty or None if nothing parsed.
     """
-    d = enchant.Dict("en_US")  # or "en_GB" for British English
-    return d.check(word)
+    models = {'openai': GPT, 'claude': CLAUDE, 'gemini': GEMINI, 'ollama': OLLAMA}
+    return llm_call_structured(input_str, 'word_list', llm_type, models.get(llm_type), stream=STREAM, count=size).value
 
-def preprocess_json_string(response):
-    """
-    Preprocesses the response string to fix common JSON formatting issues.
-    This function now checks if the input is a string before processing.
+def matrix_prompt(objective):
+    """The first-turn prompt of a game, also used to build batch files."""
+    return f""" {instructions}. Objective is: {objective}. The words have to be valid English words when read across the rows and also when read down the columns. This is very important, think quietly first. Reply with only the list of words, as follows. Ensure you reply with the correct number of words and in the correct order. For example:
+    '''
+    Word, Word, Word etc
+    '''
     """
-    if isinstance(response, str):
-        # Remove trailing commas before closing brackets or braces
-        response = re.sub(r',(?=\s*[\]])', '', response)
-        # Replace invalid characters and fix format specifiers
-        response = response.replace("'", '"')
-        response = re.sub(r'\s+', ' ', response).strip()  # Remove excess whitespace
+
+def create_word_matrix(objective, llm_type, size=None):
+    """Generate a matrix of words, starting with 'C' and ending with 'N'."""
+    response = get_llm_response(matrix_prompt(objective), llm_type, size)
     return response
 
-# @retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError, ValueError), tries=3, delay=2)
-def extract_words_from_matrix(response):
+def check_word_validity(word):
     """
-    Enhanced parsing function to extract words from a JSON response that may contain
-    various structures or formatting issues.
+    Check if a word is a valid English word using the shared pyenchant dictionary.
     """
-    print(f"Raw response is: {response}")
-    if isinstance(response, dict):
-        response_json = response
-    else:
-        # If it's a string, preprocess and parse JSON
-        response = preprocess_json_string(response)
-        try:
-            response_json = json.loads(response)
-        except json.JSONDecodeError as e:
-            print(f"Failed to decode JSON from response: {e}. Check the response format.")
-            return []
-    
-    try:
-        # Dynamically identify and extract the word list from the JSON, handling various cases
-        word_list = None
-        for value in response_json.values():
-            if isinstance(value, list):
-                word_list = value  # Direct list of words or lists
-                break
-            elif isinstance(value, str):
-                word_list = value.split(", ")  # Single string of comma-separated words
-                break
-        
-        if not word_list:
-            print("No suitable word list found in the response.")
-            return []
-
-        # If the word list is a list of lists (nested), flatten it
-        if any(isinstance(i, list) for i in word_list):
-            words = [word for sublist in word_list for word in sublist]
-        else:
-            words = word_list
-
-        # Clean and validate the words
-        words = [word.strip().replace('"', '').replace("'", "") for word in words]  # Strip and remove quotes
-        return words
+    return is_valid_word(word)
 
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON from response: {e}. Check the response format.")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return []
-    
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def check_words_validity(words):
+def check_words_validity(words, size=None):
     """
-    Checks the validity of each word in the list of words.
+    Checks the validity of every row word and every word read down the columns. With a size,
+    every row of a grid that is not size x size is invalid.
     Returns a dictionary with words as keys and their validity as boolean values.
     """
-    words_validity = {word: check_word_validity(word.lower()) for word in words}
-    # Check if the first word starts with 'C'
-    if words and not words[0].startswith('C'):
-        words_validity[words[0]] = False  # Mark as invalid
-    
-    # Check if the last word ends with 'N'
-    if words and not words[-1].endswith('N'):
-        words_validity[words[-1]] = False  # Mark as invalid
-    
-    # Check if all words have the same length
-    word_lengths = [len(word) for word in words]
-    if len(set(word_lengths)) > 1:
-        # If there are varying lengths, mark all as invalid for simplicity
-        for word in words:
-            words_validity[word] = False
+    report = validate_grid(words, size=size)
+    words_validity = {}
+    for word, valid in report['rows'] + report['columns']:
+        words_validity[word] = words_validity.get(word, True) and valid
     invalid_words_count = sum(not validity for validity in words_validity.values())
     print(f"Validity measurement is {words_validity}")
-    print(f"Number of invalid words: {invalid_words_count}\n\n")
+    print(f"Number of invalid words: {invalid_words_count}, conflicting cells: {len(report['conflicts'])}\n\n")
     return words_validity
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def regenerate_invalid_words(invalid_words, original_matrix, objective, llm_type):
+def regenerate_invalid_words(invalid_words, original_matrix, objective, llm_type, size=None):
     # Construct a prompt to regenerate only the invalid words, using the original matrix as context
     regeneration_prompt = f"""
     {small_change}. You had generated an original matrix of words:
@@ -146,11 +91,14 @@ def regenerate_invalid_words(invalid_words, original_matrix, objective, llm_type
     Word, Word, Word etc.
     '''
     """
-    response = get_llm_response(regeneration_prompt, llm_type)
+    response = get_llm_response(regeneration_prompt, llm_type, size)
     return response
 
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError), tries=3, delay=2)
-def main(attempt_number, objective, llm_type):
+def main(attempt_number, objective, llm_type, first_response=None, state=None, on_turn=None, size=None):
+    """
+    Play one attempt of up to TURNS turns. Pass the state saved by on_turn(state) after a turn to
+    resume a partly played attempt from the next turn, and the grid size to expect that many words.
+    """
     original_matrix = None
     results = {
         'attempt_number': attempt_number,
@@ -162,24 +110,40 @@ def main(attempt_number, objective, llm_type):
     max_attempts = TURNS
     response = None
     invalid_words_list = []
+    if state:
+        attempt_count = state['turn']
+        results['runs'] = list(state['runs'])
+        results['success'] = state['success']
+        original_matrix = state['original_matrix']
+        invalid_words_list = state['invalid_words_list']
+        response = state['response']
 
-    for attempt_count in range(1, max_attempts + 1):
+    for attempt_count in range(attempt_count + 1, max_attempts + 1):
         attempt_data = {
             'index': attempt_count,
             'matrix': None,
             'word_responses': None,
             'false_count': None,
+            'completable': None,
             'error': None
         }
 
         try:
-            response = create_word_matrix(objective, llm_type) if attempt_count == 1 else regenerate_invalid_words(invalid_words_list, original_matrix, objective, llm_type)
+            with trace_context(turn=attempt_count):
+                if attempt_count == 1:
+                    # A batch sweep has already fetched the first turn
+                    response = first_response if first_response else create_word_matrix(objective, llm_type, size)
+                else:
+                    response = regenerate_invalid_words(invalid_words_list, original_matrix, objective, llm_type, size)
             if not response:
                 raise ValueError("Received empty response from LLM")
 
             print(f"Response is: {response}")
-            words = extract_words_from_matrix(response)
-            all_words_validity = check_words_validity(words)
+            parsed = parse_word_list(response)
+            if not parsed:
+                print(f"Could not parse the word list: {parsed.error}")
+            words = parsed.value
+            all_words_validity = check_words_validity(words, size)
 
             invalid_words_count = sum(not validity for validity in all_words_validity.values())
 
@@ -194,11 +158,13 @@ def main(attempt_number, objective, llm_type):
                 # Break the loop if successful
             else:
                 original_matrix = response  # Save for regeneration context
+                # Whether keeping the valid rows still leaves a solvable grid
+                attempt_data['completable'] = can_complete(words, size, max_nodes=COMPLETION_NODES) if words else None
         except ValueError as ve:
             print(f"A ValueError occurred: {ve}. Continuing with the next attempt...")
             if response is not None:
-                words = extract_words_from_matrix(response)
-                all_words_validity = check_words_validity(words)
+                words = parse_word_list(response).value
+                all_words_validity = check_words_validity(words, size)
                 invalid_words_list = [word for word, isValid in all_words_validity.items() if not isValid]
                 attempt_data['matrix'] = words if 'words' in locals() else "Error occurred before matrix formation"
                 attempt_data['word_responses'] = list(all_words_validity.keys()) if 'all_words_validity' in locals() else "Error occurred before validity checking"
@@ -210,66 +176,111 @@ def main(attempt_number, objective, llm_type):
             attempt_data['error'] = str(e)
 
         results['runs'].append(attempt_data)  # Add attempt data to results regardless of success/failure
+        if on_turn:
+            on_turn({
+                'turn': attempt_count,
+                'runs': results['runs'],
+                'success': results['success'],
+                'original_matrix': original_matrix,
+                'invalid_words_list': invalid_words_list,
+                'response': response
+            })
 
     if not results['success']:
         print("Failed to generate a fully valid matrix within the maximum attempt limit.")
 
     return results
  
-def repeatedly_run_main():
-    objective_keys = ['objective_3', 'objective_4', 'objective_5']
-    llm_types = ['openai'] #['claude', 'openai', 'groq']
-
+def batch_first_turns(llm_types, objective_keys, backend=None, checkpoint=None):
+    """
+    Fetch the first turn of every openai game in one batch, keyed by (llm_type, objective_key, attempt).
+    Other providers, and games a checkpoint shows as already started, play their first turn live.
+    """
+    prompts, keys = {}, {}
     for llm_type in llm_types:
+        if llm_type != 'openai':
+            continue
         for objective_key in objective_keys:
-            objective_description = data.get(objective_key)
-            all_results = []
-            successful = False
             for attempt in range(1, ATTEMPTS + 1):
-                print(f"Global Attempt {attempt} of {ATTEMPTS} for {objective_key} using {llm_type}...")
-                results = main(attempt, objective_description, llm_type)
-                
-                successful = results.get('success', False)
-                all_results.append(results)
-                
-                if successful:
-                    print(f"Successfully generated a valid matrix for {objective_key} using {llm_type}. Exiting...")
-                    # break
-                else:
-                    print("Attempt unsuccessful.")
-            
-            # Write results after all attempts for an objective are completed
-            with open(f'results_{objective_key}_{llm_type}.json', 'w') as file:
-                json.dump(all_results, file, indent=4)
-            
-            if not successful:
-                print(f"Reached maximum attempt limit without success for {objective_key} using {llm_type}. Exiting...")
+                if checkpoint and (checkpoint.is_finished((llm_type, objective_key, attempt)) or checkpoint.state_of((llm_type, objective_key, attempt))):
+                    continue
+                custom_id = f"{llm_type}-{objective_key}-{attempt}"
+                prompts[custom_id] = matrix_prompt(data.get(objective_key))
+                keys[custom_id] = (llm_type, objective_key, attempt)
+    if not prompts:
+        return {}
+    responses = run_batch(prompts, GPT, backend=backend)
+    return {keys[custom_id]: response for custom_id, response in responses.items()}
 
-    cleanup()
+def play_game(attempt, objective_key, llm_type, first_response=None, writer=None, checkpoint=None):
+    """
+    Play one attempt, checkpointing every turn, and stream its results as soon as it finishes.
+    """
+    key = (llm_type, objective_key, attempt)
+    state, on_turn = None, None
+    if checkpoint:
+        state = checkpoint.state_of(key)
+        on_turn = lambda turn_state: checkpoint.save_state(key, turn_state)
+    with trace_context(game='wordgrid', llm_type=llm_type, objective=objective_key, attempt=attempt):
+        results = main(attempt, data.get(objective_key), llm_type, first_response, state, on_turn, objective_size(objective_key))
+    if writer:
+        writer.write({'objective_key': objective_key, **results})
+    if checkpoint:
+        checkpoint.mark_finished(key)
+    return results
 
-def cleanup():
-    archive_folder_path = '#Archive/'
-    os.makedirs(archive_folder_path, exist_ok=True)
-    os.makedirs('results', exist_ok=True)
-    
-    llm_types = ['openai'] #['claude', 'openai', 'groq']
+def repeatedly_run_main(batch=False, backend=None, resume=False):
     objective_keys = ['objective_3', 'objective_4', 'objective_5']
-    
-    combined_results = {}
+    llm_types = ['openai'] #['claude', 'openai', 'groq']
+    if not resume and os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+    checkpoint = Checkpoint(CHECKPOINT)
+    first_turns = batch_first_turns(llm_types, objective_keys, backend, checkpoint) if batch else {}
+    for objective_key in objective_keys:
+        baseline = feasibility_baseline(objective_key)
+        if baseline is False:
+            baseline = "search budget ran out before finding a grid"
+        elif baseline is None:
+            baseline = "no valid grid exists with this word list"
+        print(f"Feasibility baseline for {objective_key}: {baseline}")
+
+    # Every attempt is an independent game, so queue the whole sweep and play it concurrently,
+    # streaming each finished attempt so a crash keeps everything played so far
+    with ResultsWriter(RESULTS_STREAM, append=resume) as writer:
+        jobs, keys = [], []
+        for llm_type in llm_types:
+            for objective_key in objective_keys:
+                for attempt in range(1, ATTEMPTS + 1):
+                    if checkpoint.is_finished((llm_type, objective_key, attempt)):
+                        continue
+                    first_response = first_turns.get((llm_type, objective_key, attempt))
+                    jobs.append((llm_type, play_game, (attempt, objective_key, llm_type, first_response, writer, checkpoint)))
+                    keys.append((llm_type, objective_key))
+        print(f"Playing {len(jobs)} games across {len(llm_types)} LLMs and {len(objective_keys)} objectives...")
+        outcomes = run_games(jobs, CONCURRENCY)
 
     for llm_type in llm_types:
         for objective_key in objective_keys:
-            file_path = f'results_{objective_key}_{llm_type}.json'
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                if llm_type not in combined_results:
-                    combined_results[llm_type] = {}
-                combined_results[llm_type][f'matrix_{objective_key}'] = data
-            os.rename(file_path, archive_folder_path + os.path.basename(file_path))
+            successes = sum(1 for key, results in zip(keys, outcomes) if key == (llm_type, objective_key) and results and results.get('success', False))
+            print(f"{successes} attempts played in this session generated a valid matrix for {objective_key} using {llm_type}.")
+
+    cleanup()
+    if all(outcome is not None for outcome in outcomes):
+        checkpoint.remove()
+
+def feasibility_baseline(objective_key):
+    """
+    One valid grid for an objective found by the trie search, None if the word list has none, or
+    False if the search ran out of nodes before deciding.
+    """
+    size = objective_size(objective_key)
+    return complete_grid([None] * size, size)
 
-    combined_results_path = 'results/results_wg.json'
-    with open(combined_results_path, 'w') as file:
-        json.dump(combined_results, file, indent=4)
+def cleanup():
+    """
+    Compact the streamed results into the combined results/results_wg.json layout.
+    """
+    compact_wordgrid(RESULTS_STREAM, 'results/results_wg.json')
 
 if __name__ == "__main__":
-    repeatedly_run_main()
+    repeatedly_run_main(batch='--batch' in sys.argv, resume='--resume' in sys.argv)
@@ -1,12 +1,20 @@
 import os
+import sys
 import json
 import openai
-import enchant
-import random
 from dotenv import load_dotenv
 load_dotenv()
-from llms.llms import llm_call_gpt_json, llm_call_claude_json, llm_call_groq, llm_call_gemini_json
-from utils.retry import retry_except
+from llms.llms import llm_call_structured
+from llms.tracing import trace_context
+from llms.batch import run_batch
+from utils.dictionary import is_valid_word
+from utils.parsing import parse_word
+from puzzles.wordstore import load_word_store
+from puzzles.bank import open_bank, WORDLE_BANK
+from utils.runner import run_games
+from utils.results import ResultsWriter, compact_wordle
+from utils.checkpoint import Checkpoint
+from utils.ratelimit import configure_limits
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 with open('info.json', 'r') as file:
@@ -18,21 +26,23 @@ GPT = data.get('GPT_MODEL')
 CLAUDE = data.get('CLAUDE')
 OLLAMA = data.get('OLLAMA')
 GEMINI = data.get('GEMINI')
+CONCURRENCY = data.get('CONCURRENCY', {})
+STREAM = data.get('STREAM', False)  # Stream answers and stop reading once they are complete
+RESULTS_STREAM = 'results/results_wordle.jsonl'
+CHECKPOINT = 'results/checkpoint_wordle.json'
+ATTEMPTS_PER_LLM = 10  # Number of attempts per LLM
+configure_limits(data.get('RATE_LIMITS'))
 
 def get_llm_response(input_str, llm_type='openai'):
-    if llm_type == 'openai':
-        return llm_call_gpt_json(input_str, GPT)
-    elif llm_type == 'claude':
-        return llm_call_claude_json(input_str, CLAUDE)
-    elif llm_type == 'groq':
-        return llm_call_groq(input_str)
-    elif llm_type == 'gemini':
-        return llm_call_gemini_json(input_str)
+    """
+    The word answered by llm_type, using the provider's structured output, or None if
+    it still did not match the schema after a re-ask.
+    """
+    models = {'openai': GPT, 'claude': CLAUDE, 'gemini': GEMINI, 'ollama': OLLAMA}
+    return llm_call_structured(input_str, 'word', llm_type, models.get(llm_type), stream=STREAM, length=5).value
 
 def load_words(file_path):
-    with open(file_path, 'r') as file:
-        words = [line.strip().lower() for line in file if len(line.strip()) == 5]
-    return words
+    return list(load_word_store(file_path).words)
 
 def colorize_guess(guess, target):
     """
@@ -95,59 +105,54 @@ def colorize_guess(guess, target):
 
 def check_word_validity(word):
     """
-    Check if a word is a valid English word using pyenchant.
+    Check if a word is a valid English word using the shared pyenchant dictionary.
+    """
+    return is_valid_word(word)
+
+def guess_prompt(guess_history):
+    history_str = " ".join(guess_history)
+    return f"{instructions}. {objective}. Based on previous attempts: {history_str}. Only return the word."
+
+def play_wordle(file_path, run_id, llm_type, results, first_response=None, state=None, on_turn=None, target=None, game=0):
+    """
+    Play one game of wordle. Pass the state saved by on_turn(state) after a turn to resume a
+    partly played game with the same target and history. Without a target, one is drawn at random.
+    Every turn is recorded with its game number, the attempt index within the run.
     """
-    if not word:  # Check if the word is empty
-        return False
-    d = enchant.Dict("en_US")  # or "en_GB" for British English
-    return d.check(word)
-
-@retry_except(exceptions_to_catch=(IndexError, ZeroDivisionError, ValueError), tries=3, delay=2)
-def extract_word(response):
-    if isinstance(response, dict):
-        parsed_response = response
-    else:
-        try:
-            parsed_response = json.loads(response)
-        except json.JSONDecodeError as e:
-            print(f"Failed to decode JSON from response: {e}")
-            return ''
-        except ValueError as e:
-            print(f"ValueError: {e}")
-            return ''
-
-    if isinstance(parsed_response, dict):
-        for key, value in parsed_response.items():
-            if isinstance(value, str):
-                cleaned_response = value.replace('```', '').replace('\n', '').replace("'''", '').strip()
-                print(f"\nExtracted value: {cleaned_response}")  # Debugging: Print the extracted value
-                return cleaned_response
-        print("No suitable string value was found in the response.")
-        return ''
-    else:
-        print("The JSON response did not contain a dictionary as expected.")
-        return ''
-
-def play_wordle(file_path, run_id, llm_type, results):
-    words = load_words(file_path)
-    target = random.choice(words)
+    words = load_word_store(file_path)  # Loaded once per process and shared between games
+    target = target or words.random_word()
     attempts = 0
     max_attempts = 5
     guess_history = []  # Initialize empty list to store history of guesses and feedback
+    if state:
+        target = state['target']
+        attempts = state['attempts']
+        guess_history = list(state['guess_history'])
+        results.extend(state['results'])
+
+    def save_turn():
+        if on_turn:
+            on_turn({'target': target, 'attempts': attempts, 'guess_history': guess_history, 'results': results})
 
     while attempts <= max_attempts:
         print(f"\n This is attempt number: {attempts}. \n")
-        history_str = " ".join(guess_history)
-        input_str = f"{instructions}. {objective}. Based on previous attempts: {history_str}. Only return the word."
-
-        guess_response = get_llm_response(input_str, llm_type=llm_type)
-        guess = extract_word(guess_response).strip().lower()
+        if first_response:
+            # A batch sweep has already fetched the first guess
+            guess_response, first_response = first_response, None
+        else:
+            with trace_context(turn=attempts + 1):
+                guess_response = get_llm_response(guess_prompt(guess_history), llm_type=llm_type)
+        parsed = parse_word(guess_response)
+        if not parsed:
+            print(f"Could not parse a guess from the response: {parsed.error}")
+        guess = parsed.value
         
         words_validity = check_word_validity(guess)
         print(f"The validity of the word is: {words_validity}")
         if len(guess) != 5 or not guess.isalpha() or guess not in words:
             print("Invalid input or word not in list. Try again.")
             attempts += 1  # Increment the attempt counter to reflect the attempt
+            save_turn()
             if attempts >= max_attempts:  # Check if the maximum attempts have been reached
                 print(f"Maximum attempts reached without guessing the word. The correct word was '{target}'.")
                 break  # Exit the loop if the maximum attempts are reached break
@@ -161,6 +166,7 @@ def play_wordle(file_path, run_id, llm_type, results):
 
         results.append({
             "Global attempt #": run_id,
+            "Game #": game,
             "Run #": attempts,
             "LLM type": llm_type,
             "Target word": target,
@@ -169,27 +175,68 @@ def play_wordle(file_path, run_id, llm_type, results):
             "Number of 'Y' in colorised results": GYs.count('Y'),
             "Feedback": feedback_details
         })
+        save_turn()
 
-def main():
+def play_game(file_path, run_id, llm_type, first_response=None, writer=None, checkpoint=None, attempt=0):
+    """
+    Play a single game of wordle, checkpointing every turn, and stream its results in one write as soon as it finishes, so concurrent games don't interleave.
+    """
+    key = (llm_type, run_id, attempt)
+    state, on_turn = None, None
+    if checkpoint:
+        state = checkpoint.state_of(key)
+        on_turn = lambda turn_state: checkpoint.save_state(key, turn_state)
+    # With a puzzle bank, game n of every model plays the same target
+    bank = open_bank(WORDLE_BANK)
+    target = bank[((run_id - 1) * ATTEMPTS_PER_LLM + attempt) % len(bank)]['target'] if bank else None
+    game_results = []
+    with trace_context(game='wordle', llm_type=llm_type, run=run_id, attempt=attempt):
+        play_wordle(file_path, run_id, llm_type, game_results, first_response, state, on_turn, target, attempt)
+    if writer:
+        writer.write_many(game_results)
+    if checkpoint:
+        checkpoint.mark_finished(key)
+    return len(game_results)
+
+def batch_first_guesses(game_keys, backend=None, checkpoint=None):
+    """
+    Fetch the first guess of every openai game in one batch, keyed like game_keys.
+    Other providers, and games a checkpoint shows as already started, play their first turn live.
+    """
+    if checkpoint:
+        game_keys = [key for key in game_keys if not checkpoint.state_of(key)]
+    prompts = {f"{llm_type}-{run_id}-{attempt}": guess_prompt([]) for llm_type, run_id, attempt in game_keys if llm_type == 'openai'}
+    if not prompts:
+        return {}
+    responses = run_batch(prompts, GPT, backend=backend)
+    return {key: responses.get(f"{key[0]}-{key[1]}-{key[2]}") for key in game_keys}
+
+def main(batch=False, backend=None, resume=False):
     runs = int(input("Enter the number of runs: "))
-    attempts_per_llm = 10  # Number of attempts per LLM
-    results = []
+    attempts_per_llm = ATTEMPTS_PER_LLM
     llm_types = ['openai'] #['claude', 'openai', 'groq']
 
-    for run_id in range(1, runs + 1):
-        for llm_type in llm_types:
-            print(f"\n\n Starting run #{run_id} using {llm_type}")
-            for attempt in range(attempts_per_llm):
-                play_wordle('puzzles/wordle.txt', run_id, llm_type, results)
-
-    # Ensure the results directory exists
-    os.makedirs('results', exist_ok=True)
-
-    # Write results to file
-    with open('results/results_wordle.json', 'w') as f:
-        json.dump(results, f, indent=4)
+    game_keys = [(llm_type, run_id, attempt) for run_id in range(1, runs + 1) for llm_type in llm_types for attempt in range(attempts_per_llm)]
+    if not resume and os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+    checkpoint = Checkpoint(CHECKPOINT)
+    game_keys = [key for key in game_keys if not checkpoint.is_finished(key)]
+    first_guesses = batch_first_guesses(game_keys, backend, checkpoint) if batch else {}
+
+    # Results are streamed per game, so a crash keeps every finished game
+    with ResultsWriter(RESULTS_STREAM, append=resume) as writer:
+        jobs = []
+        for llm_type, run_id, attempt in game_keys:
+            jobs.append((llm_type, play_game, ('puzzles/wordle.txt', run_id, llm_type, first_guesses.get((llm_type, run_id, attempt)), writer, checkpoint, attempt)))
+        print(f"\n\n Playing {len(jobs)} games over {runs} runs using {', '.join(llm_types)}")
+        outcomes = run_games(jobs, CONCURRENCY)
+
+    # Compact the stream into the original JSON layout
+    compact_wordle(RESULTS_STREAM, 'results/results_wordle.json')
+    if all(outcome is not None for outcome in outcomes):
+        checkpoint.remove()
 
     print("All runs completed. Results stored in 'results/results_wordle.json'.")
 
 if __name__ == '__main__':
-    main()
+    main(batch='--batch' in sys.argv, resume='--resume' in sys.argv)